@@ -1,8 +1,9 @@
-import time
 import dearpygui.dearpygui as dpg
 import numpy as np
 import threading
 import os
+import frame_scheduler
+import life_rules
 
 '''
 Rules:
@@ -11,29 +12,39 @@ Although the universe is suppose to be infinite, I will be using an [ARR_W] x [A
   - Any live cell with two or three live neighbours lives on to the next generation.
   - Any live cell with more than three live neighbours dies, as if by overpopulation.
   - Any dead cell with exactly three live neighbours becomes a live cell, as if by reproduction.
-The module `dearpygui` store a pixel as with four values, I will represent [1,1,1,0] (transparent) as a dead cell, while [1,1,1,1] (white) would be a living cell
+These are the rule "B3/S23". [RULE] can be any other B/S rulestring (see `life_rules.py`).
+The universe is an int8 array (1 alive, 0 dead) stepped with one convolution over the whole array and one lookup in the rule table, like `Conways_game_of_life_tkinter.py`.
+The module `dearpygui` store a pixel as with four values, a living cell is drawn as [1,1,1,0] (transparent) while a dead cell is drawn as [1,1,1,1] (white). The texture is one persistent float32 RGBA array, only its alpha channel is rewritten every frame.
 '''
 
 ARR_W = 100
 ARR_W_SQ = ARR_W**2
 PIXEL_WIDTH = 4
 MAX_FRAME_PER_SEC = 6
+MAX_STEPS_PER_SEC = MAX_FRAME_PER_SEC
 CANVAS_W = ARR_W*PIXEL_WIDTH
+RULE = "B3/S23"
+ALPHA_FOR_STATE = np.array([1, 0], dtype=np.float32)
 threadEvent = threading.Event()
 playThread = None
 universeArr = None
 canvasImgVar = None
+textureArr = np.ones((CANVAS_W, CANVAS_W, 4), dtype=np.float32)
+alphaArr = np.empty((ARR_W, ARR_W), dtype=np.float32)
+ruleTable = life_rules.compileRule(RULE)
+scheduler = frame_scheduler.FrameScheduler(MAX_STEPS_PER_SEC, MAX_FRAME_PER_SEC)
 
 def initArrVal():
   global universeArr
 
-  universeArr = np.ones((ARR_W_SQ, 4), dtype=np.int8)
-  universeArr[np.random.choice(ARR_W_SQ, ARR_W_SQ//10, replace=False),3] = 0
-  universeArr = np.reshape(universeArr,( ARR_W, ARR_W, 4))
+  universeArr = np.zeros((ARR_W_SQ), dtype=np.int8)
+  universeArr[np.random.choice(ARR_W_SQ, ARR_W_SQ//10, replace=False)] = 1
+  universeArr = np.reshape(universeArr,( ARR_W, ARR_W))
 
 def enlargeArrByPixWth(inpArr):
-  intermediateArr = np.repeat(inpArr, PIXEL_WIDTH, axis=1).reshape(ARR_W, CANVAS_W, 4)
-  return np.repeat(intermediateArr, PIXEL_WIDTH, axis=0).reshape(CANVAS_W, CANVAS_W,4)
+  np.take(ALPHA_FOR_STATE, inpArr, out=alphaArr, mode="clip")
+  textureArr.reshape(ARR_W, PIXEL_WIDTH, ARR_W, PIXEL_WIDTH, 4)[..., 3] = alphaArr[:, None, :, None]
+  return textureArr
 
 def displayWindow():
   dpg.create_context()
@@ -64,45 +75,28 @@ def setPlay():
 def playLoop(e: threading.Event):
   while True:
     e.wait()
-    startTime = time.time()
-    t = threading.Thread(target=nextFrame)
-    t.start()
-    t.join()
-    endTime = time.time()
-    while ((endTime-startTime) < 1/MAX_FRAME_PER_SEC):
-      endTime = time.time()
-    print("Time to generate last frame:", endTime - startTime)
-
-def nextFrame():
+    scheduler.waitForStep()
+    nextFrame(scheduler.shouldRender())
+    scheduler.stepDone()
+    if scheduler.reportDue():
+      print(scheduler.report())
+
+def nextFrame(render: bool = True):
   global universeArr
 
-  getNextTimeStepVec = np.vectorize(nextStep, signature="()->(m,n)")
-  universeArr = getNextTimeStepVec(np.arange(ARR_W))
-  dpg.set_value("main_canvas", enlargeArrByPixWth(universeArr))
+  universeArr = stepArray(universeArr)
+  if render:
+    dpg.set_value("main_canvas", enlargeArrByPixWth(universeArr))
 
 def nextFrameWrapper():
   threadEvent.clear()
   nextFrame()
 
-def nextStep(curRow):
-  nextStepForRowV = np.vectorize(nextStepForRow, signature="(),()->(k)")
-  return nextStepForRowV(curRow, np.arange(ARR_W))
-
-def nextStepForRow(curRow, x):
-  a = universeArr
-  outputArr = np.array([1,1,1,1])
-  neighborsAlive = 8 - ( \
-    a[curRow-1,x-1,3] + a[curRow-1,x,3] + a[curRow-1,(x+1)%ARR_W,3] + \
-    a[curRow,x-1,3] + a[curRow,(x+1)%ARR_W,3] + \
-    a[(curRow+1)%ARR_W, x-1,3] + a[(curRow+1)%ARR_W, x,3] + a[(curRow+1)%ARR_W, (x+1)%ARR_W,3] \
-  )
-  if universeArr[curRow,x,3]: #cell dead
-    if (neighborsAlive==3):
-      outputArr[3] = 0
-  else: #cell alive
-    if (neighborsAlive==3 or neighborsAlive==2):
-      outputArr[3] = 0
-  return outputArr
+def applyRule(cellsArr, neighboursArr):
+  return life_rules.applyRule(ruleTable, cellsArr, neighboursArr)
+
+def stepArray(arr):
+  return life_rules.stepArray(arr, ruleTable)
 
 if __name__ == "__main__":
   initArrVal()
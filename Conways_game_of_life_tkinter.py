@@ -3,10 +3,18 @@ from tkinter import Canvas, ttk
 import tkinter as tk
 import numpy as np
 import threading
-import time
 import os
-from PIL import ImageTk, Image
-import scipy.ndimage
+import tk_renderer
+import frame_scheduler
+import bitpacked_life
+import hashlife
+import dirty_tiles
+import snapshot
+import cycle_detection
+import life_rules
+import instrumentation
+import sparse_universe
+import pattern_io
 
 '''
 Rules:
@@ -15,6 +23,15 @@ Although the universe is suppose to be infinite, I will be using an [ARR_W] x [A
   - Any live cell with two or three live neighbours lives on to the next generation.
   - Any live cell with more than three live neighbours dies, as if by overpopulation.
   - Any dead cell with exactly three live neighbours becomes a live cell, as if by reproduction.
+These are the rule "B3/S23". [RULE] can be any other B/S rulestring (see `life_rules.py`), for example "B36/S23" (HighLife). The bitpacked engine and the "Jump" button only know B3/S23, and `initArrVal` raises a ValueError if [USE_BITPACKED_ENGINE] is True with any other rule. With any other rule the "Jump" button is disabled.
+If [USE_BITPACKED_ENGINE] is True, the universe is also kept packed 64 cells per uint64 word and stepped with the bitwise engine in `bitpacked_life.py`, which gives the same results as the convolve path with a fraction of the memory traffic.
+The "Jump" button advances the universe by 2^[JUMP_EXPONENT] generations with Hashlife (see `hashlife.py`). Hashlife treats the universe as infinite, so a jump is only the same as stepping the looped array if nothing reaches the edges. Every jump uses the same Hashlife store, so the results memoized by one jump are reused by the next ones. A jump holds [STEP_LOCK] like every step, so it can't run at the same time as a step of the play loop.
+If [USE_SPARSE_UNIVERSE] is True, the universe doesn't loop: it is unbounded and stored in chunks around the live cells (see `sparse_universe.py`), and the canvas shows the [ARR_W] x [ARR_W] window at (0, 0). Gliders fly off the window instead of coming back on the other side, and a jump advances the whole universe.
+If [USE_DIRTY_TILES] is True, only the tiles that changed in the last generation (and their neighbours) are recomputed (see `dirty_tiles.py`), so the cost follows the activity on the board rather than its area.
+If [PATTERN_PATH] is set (an RLE or Macrocell file, see `pattern_io.py`), the universe starts empty with that pattern in the middle instead of random. Cells of the pattern that don't fit in the universe are dropped, and the rule of the file is ignored.
+If [HISTORY_PATH] is set, every generation is saved to that history file (see `snapshot.py`). If the file already exists, the run resumes from its last generation instead of starting from a random universe. A universe started after that is saved to a new file next to it (see `snapshot.segmentPath`), from generation 0.
+Every generation is checked for still lifes and oscillators (see `cycle_detection.py`). If [AUTO_PAUSE_ON_CYCLE] is True, the play loop pauses when one is found.
+If [INSTRUMENT] is True, the phases of every step (step, history, cycle check, waiting for the canvas thread, submit, paste), the "Next Frame" button and the jumps are timed (see `instrumentation.py`). [TIMINGS_OVERLAY] draws their percentiles on the canvas and [TIMINGS_PATH] dumps them to a CSV or JSON file every few seconds.
 '''
 
 ARR_W = 150
@@ -22,25 +39,81 @@ ARR_W_SQ = ARR_W**2
 PIXEL_WIDTH = 4
 CANVAS_W = ARR_W*PIXEL_WIDTH
 MAX_FRAME_PER_SEC = 6
+MAX_STEPS_PER_SEC = MAX_FRAME_PER_SEC
+RULE = "B3/S23"
+USE_BITPACKED_ENGINE = False
+USE_SPARSE_UNIVERSE = False
+USE_DIRTY_TILES = False
+JUMP_EXPONENT = 10
+PATTERN_PATH = None
+HISTORY_PATH = None
+AUTO_PAUSE_ON_CYCLE = True
+INSTRUMENT = False
+TIMINGS_OVERLAY = False
+TIMINGS_PATH = None
 THREAD_EVENT = threading.Event()
+STEP_LOCK = threading.Lock()
 universeArr = None
+packedArr = None
+tileStepper = None
+sparseUniverse = None
+historyWriter = None
+hashlifeStore = hashlife.HashlifeStore()
 canvas: Canvas = None
 playThread = None
 canvasThread = None
-photoVar = None
-canvasImgVar = None
-kernel = np.ones((3,3))
-kernel[1,1] = 0
+renderer = None
+scheduler = frame_scheduler.FrameScheduler(MAX_STEPS_PER_SEC, MAX_FRAME_PER_SEC)
+cycleDetector = cycle_detection.CycleDetector()
+timings = instrumentation.Instrumentation(INSTRUMENT, dumpPath=TIMINGS_PATH)
+ruleTable = life_rules.compileRule(RULE)
 
 def initArrVal():
   global universeArr
+  global packedArr
+  global tileStepper
+  global sparseUniverse
+  global historyWriter
 
-  universeArr = np.zeros((ARR_W_SQ), dtype=np.int8)
-  universeArr[np.random.choice(ARR_W_SQ, ARR_W_SQ//10, replace=False)] = 1
-  universeArr = np.reshape(universeArr,( ARR_W, ARR_W))
+  if USE_BITPACKED_ENGINE and not life_rules.isConway(ruleTable):
+    raise ValueError(f"The bitpacked engine only runs {life_rules.CONWAY_RULE}, not {RULE}")
+  if HISTORY_PATH != None and historyWriter == None and os.path.exists(HISTORY_PATH):
+    universeArr = snapshot.loadSnapshot(HISTORY_PATH)
+    historyWriter = snapshot.HistoryWriter(HISTORY_PATH, universeArr.shape, append=True)
+  else:
+    if PATTERN_PATH != None:
+      universeArr = np.zeros((ARR_W, ARR_W), dtype=np.int8)
+      pattern_io.loadPattern(PATTERN_PATH, universeArr)
+    else:
+      universeArr = np.zeros((ARR_W_SQ), dtype=np.int8)
+      universeArr[np.random.choice(ARR_W_SQ, ARR_W_SQ//10, replace=False)] = 1
+      universeArr = np.reshape(universeArr,( ARR_W, ARR_W))
+    if HISTORY_PATH != None:
+      startHistory()
+  if USE_BITPACKED_ENGINE:
+    packedArr = bitpacked_life.packGrid(universeArr)
+  if USE_SPARSE_UNIVERSE:
+    sparseUniverse = sparse_universe.SparseUniverse(ruleTable)
+    sparseUniverse.paste(universeArr)
+  if USE_DIRTY_TILES:
+    tileStepper = dirty_tiles.DirtyTileStepper(universeArr, applyRule)
+  cycleDetector.reset()
+  cycleDetector.update(universeArr)
+
+def startHistory():
+  global historyWriter
+
+  path = HISTORY_PATH
+  if historyWriter != None:
+    historyWriter.close()
+    path = snapshot.segmentPath(HISTORY_PATH)
+    print(f"New universe, the history continues in {path}")
+  historyWriter = snapshot.HistoryWriter(path, universeArr.shape)
+  historyWriter.append(universeArr)
 
 def displayWindow():
   global canvas
+  global renderer
   root = tk.Tk()
   root.title("Conway's Game of Life")
   s = ttk.Style()
@@ -48,32 +121,79 @@ def displayWindow():
   frm = ttk.Frame(root, style='My.TFrame')
   frm.grid(padx=10, pady=10)
   canvas = tk.Canvas(frm, borderwidth=0, highlightthickness=0, height=CANVAS_W, width=CANVAS_W)
-  canvas.grid(column=0, row=0, columnspan=2)
+  canvas.grid(column=0, row=0, columnspan=3)
+  renderer = tk_renderer.TkGridRenderer(canvas, (ARR_W, ARR_W), PIXEL_WIDTH, timings=timings)
+  if TIMINGS_OVERLAY:
+    instrumentation.CanvasOverlay(canvas, timings)
   canvasThread.start()
   ttk.Button(frm, text="Play/Pause", command=setPlay).grid(column=0, row=1, pady=10)
   ttk.Button(frm, text="Next Frame", command=nextFrame).grid(column=1, row=1, pady=10)
-  root.protocol("WM_DELETE_WINDOW",os.abort)
+  jumpBtn = ttk.Button(frm, text=f"Jump 2^{JUMP_EXPONENT}", command=lambda: threading.Thread(target=jumpFrames).start())
+  jumpBtn.grid(column=2, row=1, pady=10)
+  if not life_rules.isConway(ruleTable):
+    jumpBtn["state"] = "disabled"
+
+  root.protocol("WM_DELETE_WINDOW",closeWindow)
   root.configure(background='dark gray')
   root.mainloop()
 
+def closeWindow():
+  if historyWriter != None:
+    historyWriter.close()
+  os.abort()
+
 def setCanvasThread():
-  global photoVar
-  global canvasImgVar
-
-  intermediateArr = np.repeat(np.logical_not(universeArr), PIXEL_WIDTH, axis=1).reshape(ARR_W, CANVAS_W)
-  largeArr = np.repeat(intermediateArr, PIXEL_WIDTH, axis=0).reshape(CANVAS_W, CANVAS_W)
-  newPhoto =  ImageTk.PhotoImage(image=Image.fromarray(largeArr*255))
-  if(canvasImgVar == None):
-    canvasImgVar = canvas.create_image(0,0, anchor="nw", image=newPhoto)
-  else:
-    canvas.itemconfig(canvasImgVar, image=newPhoto)
-  photoVar = newPhoto
+  renderer.submit(universeArr)
 
 def nextFrame():
   THREAD_EVENT.clear()
-  startTime = time.time()
-  setNextTimestep()
-  print("Time to generate last frame:", time.time() - startTime)
+  with timings.phase("nextFrame"):
+    setNextTimestep()
+
+def jumpSparse():
+  # cells move at most one cell per generation, so everything stays within 2^JUMP_EXPONENT cells of the live area
+  global sparseUniverse
+
+  bounds = sparseUniverse.bounds()
+  if bounds == None:
+    return universeArr
+  top, left, height, width = bounds
+  universe = hashlife.HashlifeUniverse(sparseUniverse.toArray(top, left, height, width), store=hashlifeStore)
+  universe.advancePow2(JUMP_EXPONENT)
+  margin = 1 << JUMP_EXPONENT
+  jumped = universe.toArray(universe.origin - margin, universe.origin - margin, height + 2*margin, width + 2*margin)
+  sparseUniverse = sparse_universe.SparseUniverse(ruleTable)
+  sparseUniverse.paste(jumped, top - margin, left - margin)
+  return sparseUniverse.toArray(0, 0, ARR_W, ARR_W)
+
+def jumpFrames():
+  global universeArr
+  global packedArr
+  global canvasThread
+
+  if not life_rules.isConway(ruleTable):
+    raise ValueError(f"Hashlife only runs {life_rules.CONWAY_RULE}, not {RULE}")
+  THREAD_EVENT.clear()
+  with STEP_LOCK, timings.phase("jump"):
+    if USE_SPARSE_UNIVERSE:
+      nextTimestep = jumpSparse()
+    else:
+      universe = hashlife.HashlifeUniverse(universeArr, store=hashlifeStore)
+      universe.advancePow2(JUMP_EXPONENT)
+      nextTimestep = universe.toArray()
+    if historyWriter != None:
+      historyWriter.append(nextTimestep, historyWriter.nextGeneration - 1 + (1 << JUMP_EXPONENT))
+    cycleDetector.reset(cycleDetector.generation - 1 + (1 << JUMP_EXPONENT))
+    cycleDetector.update(nextTimestep)
+    if canvasThread.is_alive():
+      canvasThread.join()
+    universeArr = nextTimestep
+    if USE_BITPACKED_ENGINE:
+      packedArr = bitpacked_life.packGrid(universeArr)
+    if USE_DIRTY_TILES:
+      tileStepper.reset(universeArr)
+    canvasThread = threading.Thread(target=setCanvasThread)
+    canvasThread.start()
 
 def setPlay():
   if(THREAD_EVENT.is_set()):
@@ -84,22 +204,59 @@ def setPlay():
 def playLoop(e: threading.Event):
   while True:
     e.wait()
-    startTime = time.time()
-    t = threading.Thread(target=setNextTimestep)
-    t.start()
-    t.join()
-    endTime = time.time()
-    while ((endTime-startTime) < 1/MAX_FRAME_PER_SEC):
-      endTime = time.time()
-    #print("Time to generate last frame:", endTime - startTime)
-
-def setNextTimestep():
+    scheduler.waitForStep()
+    setNextTimestep(scheduler.shouldRender(canvasThread.is_alive()))
+    scheduler.stepDone()
+    timings.dumpIfDue()
+    if scheduler.reportDue():
+      print(scheduler.report())
+
+def checkCycle(arr):
+  if cycleDetector.update(arr):
+    print(cycleDetector.describe())
+    if AUTO_PAUSE_ON_CYCLE:
+      THREAD_EVENT.clear()
+
+def applyRule(cellsArr, neighboursArr):
+  return life_rules.applyRule(ruleTable, cellsArr, neighboursArr)
+
+def stepArray(arr):
+  return life_rules.stepArray(arr, ruleTable)
+
+def setNextTimestep(render: bool = True):
+  with STEP_LOCK:
+    stepUniverse(render)
+
+def stepUniverse(render: bool):
   global universeArr
+  global packedArr
   global canvasThread
 
-  neighboursArr = scipy.ndimage.convolve(universeArr, kernel, mode="wrap")
-  nextTimestep = np.where(neighboursArr == 2, universeArr, neighboursArr == 3)
-  canvasThread.join()
+  if USE_DIRTY_TILES and canvasThread != None and canvasThread.is_alive():
+    # the stepper writes into its buffer of two generations ago, which the canvas thread may still be drawing
+    with timings.phase("canvasJoin"):
+      canvasThread.join()
+  with timings.phase("step"):
+    if USE_BITPACKED_ENGINE:
+      packedArr = bitpacked_life.stepPacked(packedArr, ARR_W)
+      nextTimestep = bitpacked_life.unpackGrid(packedArr, ARR_W)
+    elif USE_SPARSE_UNIVERSE:
+      sparseUniverse.step()
+      nextTimestep = sparseUniverse.toArray(0, 0, ARR_W, ARR_W)
+    elif USE_DIRTY_TILES:
+      nextTimestep = tileStepper.step()
+    else:
+      nextTimestep = stepArray(universeArr)
+  if historyWriter != None:
+    with timings.phase("history"):
+      historyWriter.append(nextTimestep)
+  with timings.phase("cycleCheck"):
+    checkCycle(nextTimestep)
+  if not render:
+    universeArr = nextTimestep
+    return
+  with timings.phase("canvasJoin"):
+    canvasThread.join()
   universeArr = nextTimestep
   canvasThread = threading.Thread(target=setCanvasThread)
   canvasThread.start()
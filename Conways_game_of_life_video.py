@@ -1,7 +1,22 @@
-
+import queue
+import threading
+import time
 import numpy as np
 import cv2 as cv
-import scipy.ndimage
+import bitpacked_life
+import life_rules
+
+'''
+The video is rendered by a pipeline of four threads connected by bounded queues, so the simulation of the next generations overlaps with the encoding of the previous ones:
+  simulate -> colour -> upscale -> encode
+  - simulate: steps the universe and passes every generation on.
+  - colour: looks the colour of every cell up in [PALETTE] (dead, alive) and writes it into a preallocated (ARR_H, ARR_W, 3) frame.
+  - upscale: writes every cell of the frame as a [SIZE_EXTENSION_FOR_VIDEO] x [SIZE_EXTENSION_FOR_VIDEO] block into a preallocated video sized frame (nearest neighbour `cv.resize`).
+  - encode: passes the frame to `cv.VideoWriter.write`.
+The frames are recycled through pools of [QUEUE_SIZE]+2 buffers, so nothing is allocated per frame after the start. NumPy and OpenCV release the GIL during the copies and the encoding, so the stages run in parallel.
+The universe follows [RULE], a B/S rulestring (see `life_rules.py`). The bitpacked engine only knows B3/S23, and `renderVideo` raises a ValueError if [USE_BITPACKED_ENGINE] is True with any other rule.
+Every stage counts its frames and the time it was busy. `renderVideo` returns these stats along with the frames per second of the whole run.
+'''
 
 ARR_W = 200
 ARR_H = 180
@@ -13,25 +28,119 @@ FPS = 6
 FILENAME = 'output.avi'
 DEAD_COLOR = np.array([187,227,255], dtype=np.uint8)
 ALIVE_COLOR = [138,186,252]
+PALETTE = np.array([DEAD_COLOR, ALIVE_COLOR], dtype=np.uint8)
 ALIVE_DEAD_RATIO_AT_START = 0.3
-KERNEL = [[1,1,1],[1,0,1],[1,1,1]]
+RULE = "B3/S23"
+USE_BITPACKED_ENGINE = False
+QUEUE_SIZE = 8
+
+class StageStats:
+  def __init__(self, name: str):
+    self.name = name
+    self.frames = 0
+    self.busySeconds = 0
+
+  def asDict(self):
+    return {"frames": self.frames, "busySeconds": self.busySeconds, "framesPerBusySecond": self.frames / self.busySeconds if self.busySeconds else None}
+
+def initArrVal():
+  universeArr = np.random.choice([0,1], (ARR_H, ARR_W), p=[1-ALIVE_DEAD_RATIO_AT_START,ALIVE_DEAD_RATIO_AT_START])
+  #uncomment if you want middle area to remain empty
+  #universeArr[:, W_CHANGE_ON_ONE_SIDE: -W_CHANGE_ON_ONE_SIDE] = 0
+  return universeArr.astype(np.int8)
+
+def colourFrame(universeArr, out):
+  np.take(PALETTE, universeArr, axis=0, out=out, mode="clip")
+  return out
+
+def upscaleFrame(frame, out):
+  # nearest neighbour resizing by an integer factor repeats every cell in a block, like np.repeat did
+  cv.resize(frame, (out.shape[1], out.shape[0]), dst=out, interpolation=cv.INTER_NEAREST)
+  return out
+
+def simulateStage(universeArr, frames: int, outQueue, stats):
+  width = universeArr.shape[1]
+  ruleTable = life_rules.compileRule(RULE)
+  if USE_BITPACKED_ENGINE:
+    packedArr = bitpacked_life.packGrid(universeArr)
+  for _ in range(frames):
+    startTime = time.perf_counter()
+    if USE_BITPACKED_ENGINE:
+      packedArr = bitpacked_life.stepPacked(packedArr, width)
+      universeArr = bitpacked_life.unpackGrid(packedArr, width)
+    else:
+      universeArr = life_rules.stepArray(universeArr, ruleTable)
+    stats.busySeconds += time.perf_counter() - startTime
+    stats.frames += 1
+    outQueue.put(universeArr)
+  outQueue.put(None)
+
+def mapStage(function, inQueue, outQueue, freeBuffers, returnBuffers, stats):
+  # applies function(item, buffer) to every item, the buffer comes from [freeBuffers] and the item is given back to [returnBuffers]
+  while True:
+    item = inQueue.get()
+    if item is None:
+      outQueue.put(None)
+      return
+    buffer = freeBuffers.get()
+    startTime = time.perf_counter()
+    function(item, buffer)
+    stats.busySeconds += time.perf_counter() - startTime
+    stats.frames += 1
+    if returnBuffers is not None:
+      returnBuffers.put(item)
+    outQueue.put(buffer)
+
+def encodeStage(out, inQueue, returnBuffers, stats):
+  while True:
+    img = inQueue.get()
+    if img is None:
+      return
+    startTime = time.perf_counter()
+    out.write(img)
+    stats.busySeconds += time.perf_counter() - startTime
+    stats.frames += 1
+    returnBuffers.put(img)
+
+def bufferPool(shape):
+  pool = queue.Queue()
+  for _ in range(QUEUE_SIZE+2):
+    pool.put(np.empty(shape, dtype=np.uint8))
+  return pool
 
-universeArr = np.random.choice([0,1], (ARR_H, ARR_W), p=[1-ALIVE_DEAD_RATIO_AT_START,ALIVE_DEAD_RATIO_AT_START])
-#uncomment if you want middle area to remain empty
-#universeArr[:, W_CHANGE_ON_ONE_SIDE: -W_CHANGE_ON_ONE_SIDE] = 0
+def renderVideo(universeArr=None, frames: int = FPS*DURATION, filename: str = FILENAME):
+  if USE_BITPACKED_ENGINE and not life_rules.isConway(life_rules.compileRule(RULE)):
+    raise ValueError(f"The bitpacked engine only runs {life_rules.CONWAY_RULE}, not {RULE}")
+  if universeArr is None:
+    universeArr = initArrVal()
+  h, w = universeArr.shape
+  s = SIZE_EXTENSION_FOR_VIDEO
+  out = cv.VideoWriter(filename, FOURCC, FPS, (w*s, h*s))
 
-out = cv.VideoWriter(FILENAME, FOURCC, FPS, (ARR_W*SIZE_EXTENSION_FOR_VIDEO, ARR_H*SIZE_EXTENSION_FOR_VIDEO))
+  universeQueue = queue.Queue(QUEUE_SIZE)
+  colourQueue = queue.Queue(QUEUE_SIZE)
+  imgQueue = queue.Queue(QUEUE_SIZE)
+  colourBuffers = bufferPool((h, w, 3))
+  imgBuffers = bufferPool((h*s, w*s, 3))
+  stats = {name: StageStats(name) for name in ("simulate", "colour", "upscale", "encode")}
 
-for _ in range(FPS*DURATION):
-  neighoursCount = scipy.ndimage.convolve(universeArr, KERNEL, mode="wrap")
-  universeArr = np.where(neighoursCount == 2, universeArr, neighoursCount == 3)
-  onesPos = np.argwhere(universeArr)
-  newArr = np.ones((ARR_H, ARR_W,3), dtype=np.uint8)
-  newArr *= DEAD_COLOR
-  if(len(onesPos)):
-    newArr[onesPos[:,0],onesPos[:,1],:] = ALIVE_COLOR
-  img = np.repeat(np.repeat(newArr, SIZE_EXTENSION_FOR_VIDEO, axis=1), SIZE_EXTENSION_FOR_VIDEO, axis=0)
-  out.write(img)
+  startTime = time.perf_counter()
+  threads = [
+    threading.Thread(target=simulateStage, args=(universeArr, frames, universeQueue, stats["simulate"])),
+    threading.Thread(target=mapStage, args=(colourFrame, universeQueue, colourQueue, colourBuffers, None, stats["colour"])),
+    threading.Thread(target=mapStage, args=(upscaleFrame, colourQueue, imgQueue, imgBuffers, colourBuffers, stats["upscale"])),
+    threading.Thread(target=encodeStage, args=(out, imgQueue, imgBuffers, stats["encode"])),
+  ]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  out.release()
 
-out.release()
+  elapsed = time.perf_counter() - startTime
+  result = {"frames": stats["encode"].frames, "seconds": elapsed, "framesPerSecond": stats["encode"].frames / elapsed if elapsed else None}
+  result["stages"] = {name: stage.asDict() for name, stage in stats.items()}
+  return result
 
+if __name__ == "__main__":
+  print(renderVideo())
@@ -4,10 +4,15 @@ from tkinter import END, Canvas, StringVar, ttk
 import tkinter as tk
 import numpy as np
 import threading
-import time
 import os
-from PIL import ImageTk, Image
 import scipy.ndimage
+import tk_renderer
+import frame_scheduler
+import fft_convolution
+import parallel_stepping
+import snapshot
+import instrumentation
+import kernel_cache
 
 '''
 Lenia is like Conway's Game of Life but with continuous states, time and space. read this article for more insight [https://hegl.mathi.uni-heidelberg.de/continuous-cellular-automata/].
@@ -27,6 +32,20 @@ Lenia is suppose to have infinite states in the range [0, 1], which gets updated
 
 After evaluating the growth function, it is multiplied by 1/F (variable timeFrac is used for F) where F is the update frequency. By using larger values of F, we can simulate "continuous time." 
 
+If [USE_FFT] is True, the potential is computed as a periodic convolution through real FFTs (see `fft_convolution.py`) instead of `scipy.ndimage.correlate`. The spectrum of the kernel is computed once in `setkernel`, so every step costs O(N^2 log N) whatever the kernel size.
+
+Kernels and their spectra are kept in an LRU cache of [KERNEL_CACHE_BYTES] (see `kernel_cache.py`), keyed by the kernel size (and the universe shape and [PRECISION] for the spectra), so setting a kernel size that was set before doesn't evaluate the bell function or the FFT again.
+
+If [PARALLEL_WORKERS] is more than 0, the universe is stepped in strips on that many processes (see `parallel_stepping.py`), with `scipy.ndimage.correlate` on every strip.
+
+If [HISTORY_PATH] is set, every generation is saved to that history file, quantised to [HISTORY_QUANT_BITS] bits (see `snapshot.py`). If the file already exists, the run resumes from its last generation instead of starting from a random universe. A universe started after that (reset or a new seed) is saved to a new file next to it (see `snapshot.segmentPath`), from generation 0.
+
+[PRECISION] is the float type of the universe (np.float32 or np.float64). float32 halves the memory and the memory traffic of every step. The universe lives in two preallocated buffers: every step reads one and writes the next generation into the other, and the growth function is evaluated in place with `out=`, so stepping doesn't allocate (apart from the FFT spectra, which scipy.fft always allocates, and the parallel path).
+
+If [INSTRUMENT] is True, the phases of every step (convolution, growth, history, waiting for the canvas thread, submit, paste) and the "Next Frame" button are timed (see `instrumentation.py`). [TIMINGS_OVERLAY] draws their percentiles on the canvas and [TIMINGS_PATH] dumps them to a CSV or JSON file every few seconds.
+
+If [USE_GROWTH_TABLE] is True, the growth function is read from a table of [GROWTH_TABLE_SIZE] values over [0, 1] with linear interpolation instead of evaluating exp on every cell (the potential is a weighted mean of cells in [0, 1], so it is in [0, 1] too). The table is rebuilt in `setkernel` only when the growth mean or s.d. changed. Linear interpolation with spacing h = 1/(GROWTH_TABLE_SIZE-1) is off by at most h^2/8 * max|growth''| = h^2 / (4 * s^2), for example 6.6e-5 for s = 0.015 and 4096 entries (before the 1/F scaling, and apart from the rounding of [PRECISION]). `setkernel` prints the bound. The parallel path always evaluates the function.
+
 '''
 
 ARR_W = 100
@@ -35,29 +54,101 @@ KERNEL_SIZE_RANGE = [1,ARR_W-1]
 PIXEL_WIDTH = 4
 CANVAS_W = ARR_W*PIXEL_WIDTH
 MAX_FRAME_PER_SEC = 24
+MAX_STEPS_PER_SEC = MAX_FRAME_PER_SEC
+USE_FFT = True
+KERNEL_CACHE_BYTES = kernel_cache.DEFAULT_MAX_BYTES
+PARALLEL_WORKERS = 0
+HISTORY_PATH = None
+HISTORY_QUANT_BITS = 16
+PRECISION = np.float64
+USE_GROWTH_TABLE = False
+GROWTH_TABLE_SIZE = 4096
+INSTRUMENT = False
+TIMINGS_OVERLAY = False
+TIMINGS_PATH = None
 SEED_DIGITS = 9
 seed = 0
 universeArr = None
+universeBuffers = None
+potentialArr = None
+growthTable = None
+growthSlopes = None
+growthTableParams = None
+tableIndexArr = None
+tableScratchArr = None
 canvas: Canvas = None
 canvasThread = None
 playThread = None
-photoVar = None
-canvasImgVar = None
+renderer = None
+scheduler = frame_scheduler.FrameScheduler(MAX_STEPS_PER_SEC, MAX_FRAME_PER_SEC)
+timings = instrumentation.Instrumentation(INSTRUMENT, dumpPath=TIMINGS_PATH)
 kernel = None
+kernelSpectrum = None
+kernelCache = kernel_cache.KernelCache(KERNEL_CACHE_BYTES)
+parallelExecutor = None
+historyWriter = None
 paused = True
 btnsList = None
 timeFrac = 10
 growthMean = 0
 growthStdDev = 1
 
+def allocateBuffers():
+  global universeBuffers
+  global potentialArr
+  global tableIndexArr
+  global tableScratchArr
+
+  if universeBuffers == None:
+    universeBuffers = [np.empty((ARR_W,ARR_W), dtype=PRECISION) for _ in range(2)]
+    potentialArr = np.empty((ARR_W,ARR_W), dtype=PRECISION)
+    if USE_GROWTH_TABLE:
+      tableIndexArr = np.empty((ARR_W,ARR_W), dtype=np.intp)
+      tableScratchArr = np.empty((ARR_W,ARR_W), dtype=PRECISION)
+
 def initArrVal():
   global universeArr
 
+  allocateBuffers()
   np.random.seed(seed)
-  universeArr = np.random.random((ARR_W,ARR_W))
+  universeArr = universeBuffers[0]
+  universeArr[...] = np.random.random((ARR_W,ARR_W))
+
+def openHistory():
+  global universeArr
+  global historyWriter
+
+  if os.path.exists(HISTORY_PATH):
+    universeArr = universeBuffers[0]
+    universeArr[...] = snapshot.loadSnapshot(HISTORY_PATH)
+    historyWriter = snapshot.HistoryWriter(HISTORY_PATH, universeArr.shape, append=True)
+  else:
+    startHistory()
+
+def startHistory():
+  global historyWriter
+
+  path = HISTORY_PATH
+  if historyWriter != None:
+    historyWriter.close()
+    path = snapshot.segmentPath(HISTORY_PATH)
+    print(f"New universe, the history continues in {path}")
+  historyWriter = snapshot.HistoryWriter(path, universeArr.shape, snapshot.CONTINUOUS, HISTORY_QUANT_BITS)
+  historyWriter.append(universeArr)
+
+def recordHistory(arr):
+  if historyWriter != None:
+    with timings.phase("history"):
+      historyWriter.append(arr)
+
+def closeWindow():
+  if historyWriter != None:
+    historyWriter.close()
+  os.abort()
 
 def displayWindow():
   global canvas
+  global renderer
   global btnsList
 
   root = tk.Tk()
@@ -110,6 +201,9 @@ def displayWindow():
 
   canvas = tk.Canvas(frm, borderwidth=0, highlightthickness=0, height=CANVAS_W, width=CANVAS_W)
   canvas.grid(column=1, row=0, columnspan=3, rowspan=10, padx=(10,0))
+  renderer = tk_renderer.TkGridRenderer(canvas, (ARR_W, ARR_W), PIXEL_WIDTH, continuous=True, timings=timings)
+  if TIMINGS_OVERLAY:
+    instrumentation.CanvasOverlay(canvas, timings)
   canvasThread.start()
 
   playPauseBtn =  ttk.Button(frm, text="Play/Pause", command=setPlay)
@@ -127,25 +221,25 @@ def displayWindow():
   btnsList = [kernelSizeW, growthMW, growthStdDevW, timeW, seedEntry, completeSettingBtn, playPauseBtn, nextFrameBtn, resetBtn]
   completeSettingBtn.config(command=lambda: setkernel(kSize.get(), growM.get(), growthStdDev.get(), timeVal.get()))
 
-  root.protocol("WM_DELETE_WINDOW",os.abort)
+  root.protocol("WM_DELETE_WINDOW",closeWindow)
   root.configure(background='dark gray')
   root.mainloop()
 
 def setCanvasThread():
-  global photoVar
-  global canvasImgVar
-
-  intermediateArr = np.repeat(universeArr, PIXEL_WIDTH, axis=1).reshape(ARR_W, CANVAS_W)
-  largeArr = np.repeat(intermediateArr, PIXEL_WIDTH, axis=0).reshape(CANVAS_W, CANVAS_W)
-  newPhoto =  ImageTk.PhotoImage(image=Image.fromarray((largeArr*255).astype(np.uint8)))
-  if(canvasImgVar == None):
-    canvasImgVar = canvas.create_image(0,0, anchor="nw", image=newPhoto)
-  else:
-    canvas.itemconfig(canvasImgVar, image=newPhoto)
-  photoVar = newPhoto
+  renderer.submit(universeArr)
+
+def buildKernel(size: int):
+  ringR = math.floor(size * 0.75)
+  bell = lambda x, m, s: np.exp(-((x-m)/s)**2 / 2)
+  tempArr = (np.arange(-size,size+1))**2
+  tempArr2 = tempArr[:,None] + tempArr
+  kernel = bell(tempArr2, ringR**2, (ringR**2)/2)
+  return kernel/np.sum(kernel)
 
 def setkernel(size: str, growM: str, growthSd: str, timeVal:str):
   global kernel
+  global kernelSpectrum
+  global parallelExecutor
   global timeFrac
   global growthMean
   global growthStdDev
@@ -168,12 +262,16 @@ def setkernel(size: str, growM: str, growthSd: str, timeVal:str):
   for btn in btnsList[6:]:
     btn["state"] = "enabled"
 
-  ringR = math.floor(size * 0.75)
-  bell = lambda x, m, s: np.exp(-((x-m)/s)**2 / 2)
-  tempArr = (np.arange(-size,size+1))**2
-  tempArr2 = tempArr[:,None] + tempArr
-  kernel = bell(tempArr2, ringR**2, (ringR**2)/2)
-  kernel = kernel/np.sum(kernel)
+  kernel = kernelCache.get(kernel_cache.kernelKey("kernel", "ring", size), lambda: buildKernel(size))
+  if USE_GROWTH_TABLE:
+    setGrowthTable(growthMean, growthStdDev)
+  if USE_FFT:
+    key = kernel_cache.kernelKey("spectrum", "ring", size, None, (ARR_W, ARR_W), PRECISION)
+    kernelSpectrum = kernelCache.get(key, lambda: fft_convolution.kernelSpectrum(kernel, (ARR_W, ARR_W), PRECISION))
+  if PARALLEL_WORKERS > 0:
+    if parallelExecutor != None:
+      parallelExecutor.close()
+    parallelExecutor = parallel_stepping.SharedMemoryExecutor((ARR_W, ARR_W), PRECISION, stepArray, (kernel, growthMean, growthStdDev, timeFrac), halo=size, workers=PARALLEL_WORKERS)
 
   return None
 
@@ -185,6 +283,8 @@ def seedValidator(P):
   if str.isdigit(P) and len(P) < SEED_DIGITS:
     seed = int(P)
     initArrVal()
+    if historyWriter != None:
+      startHistory()
     setCanvasThread()
     return True
   else:
@@ -198,11 +298,11 @@ def nextFrame():
   paused = True
   if(playThread != None):
     playThread.join()
-  startTime = time.time()
-  universeArr = getNextTimestep()
-  canvasThread = threading.Thread(target=setCanvasThread)
-  canvasThread.start()
-  print("Time to generate last frame:", time.time() - startTime)
+  with timings.phase("nextFrame"):
+    universeArr = getNextTimestep()
+    recordHistory(universeArr)
+    canvasThread = threading.Thread(target=setCanvasThread)
+    canvasThread.start()
 
 def setPlay():
   global paused
@@ -226,6 +326,8 @@ def reset():
   if(playThread != None and playThread.is_alive()):
     playThread.join()
   initArrVal()
+  if historyWriter != None:
+    startHistory()
   canvasThread = threading.Thread(target=setCanvasThread)
   canvasThread.start()
   for btn in btnsList[:6]:
@@ -235,26 +337,106 @@ def playLoop():
   global universeArr
   global canvasThread
 
+  scheduler.reset()
   while not paused:
-    startTime = time.time()
+    scheduler.waitForStep()
     newArr = getNextTimestep()
-    canvasThread.join()
-    universeArr = newArr
-    canvasThread = threading.Thread(target=setCanvasThread)
-    canvasThread.start()
-    endTime = time.time()
-    while (endTime-startTime) < 1/MAX_FRAME_PER_SEC:
-      endTime = time.time()
-    print("Time to generate last frame:", time.time() - startTime)
-
-def growth(arr):
-  return 2 * np.exp(-0.5 * (((arr-growthMean)/growthStdDev)**2)) -1
+    recordHistory(newArr)
+    scheduler.stepDone()
+    if scheduler.shouldRender(canvasThread.is_alive()):
+      with timings.phase("canvasJoin"):
+        canvasThread.join()
+      universeArr = newArr
+      canvasThread = threading.Thread(target=setCanvasThread)
+      canvasThread.start()
+    else:
+      universeArr = newArr
+    timings.dumpIfDue()
+    if scheduler.reportDue():
+      print(scheduler.report())
+
+def growth(arr, mean, sd, out=None):
+  # 2 * e^(-0.5 * ((arr-mean)/sd)^2) - 1, evaluated in [out] (which may be [arr])
+  out = np.subtract(arr, mean, out=out)
+  out /= sd
+  np.square(out, out=out)
+  out *= -0.5
+  np.exp(out, out=out)
+  out *= 2
+  out -= 1
+  return out
+
+def buildGrowthTable(mean, sd, size: int = GROWTH_TABLE_SIZE):
+  # the growth at size evenly spaced points over [0, 1], and the slope after every point (0 after the last one)
+  table = growth(np.linspace(0, 1, size), mean, sd).astype(PRECISION)
+  return table, np.append(np.diff(table), table.dtype.type(0))
+
+def growthTableErrorBound(sd, size: int = GROWTH_TABLE_SIZE):
+  return 1 / (4 * sd**2 * (size-1)**2)
+
+def setGrowthTable(mean, sd):
+  global growthTable
+  global growthSlopes
+  global growthTableParams
+
+  if growthTableParams != (mean, sd, GROWTH_TABLE_SIZE):
+    growthTable, growthSlopes = buildGrowthTable(mean, sd)
+    growthTableParams = (mean, sd, GROWTH_TABLE_SIZE)
+    print(f"Growth table error is at most {growthTableErrorBound(sd):.2e}")
+
+def growthFromTable(arr, table, slopes, out, indexArr, scratchArr):
+  # linear interpolation of [table] at [arr], evaluated in [out] (which may be [arr]) with [indexArr] and [scratchArr] as scratch space
+  np.multiply(arr, len(table)-1, out=out)
+  np.clip(out, 0, len(table)-1, out=out)
+  np.floor(out, out=scratchArr)
+  np.copyto(indexArr, scratchArr, casting="unsafe")
+  out -= scratchArr
+  np.take(slopes, indexArr, out=scratchArr, mode="clip")
+  out *= scratchArr
+  np.take(table, indexArr, out=scratchArr, mode="clip")
+  out += scratchArr
+  return out
+
+def addGrowth(arr, growthArr, timeFrac, out):
+  growthArr *= 1/timeFrac
+  np.add(arr, growthArr, out=out)
+  return np.clip(out, 0, 1, out=out)
+
+def updateInto(arr, potential, mean, sd, timeFrac, out):
+  # [potential] is overwritten with the growth
+  growth(potential, mean, sd, out=potential)
+  return addGrowth(arr, potential, timeFrac, out)
+
+def stepArray(arr, kernel, mean, sd, timeFrac):
+  potential = scipy.ndimage.correlate(arr, kernel, mode="wrap")
+  return updateInto(arr, potential, mean, sd, timeFrac, np.empty_like(arr))
+
+def nextBuffer():
+  # the canvas thread may still be drawing the buffer that is about to be overwritten
+  if canvasThread != None and canvasThread.is_alive():
+    with timings.phase("canvasJoin"):
+      canvasThread.join()
+  return universeBuffers[1] if universeArr is universeBuffers[0] else universeBuffers[0]
 
 def getNextTimestep():
-  nextTimestep = scipy.ndimage.correlate(universeArr, kernel, mode="wrap")
-  return np.clip(universeArr + (1/timeFrac * growth(nextTimestep)), 0, 1)
+  if parallelExecutor != None:
+    with timings.phase("parallelStep"):
+      return parallelExecutor.run(universeArr)
+  with timings.phase("convolution"):
+    if USE_FFT:
+      potential = fft_convolution.correlateWrap(universeArr, kernelSpectrum)
+    else:
+      potential = scipy.ndimage.correlate(universeArr, kernel, output=potentialArr, mode="wrap")
+  out = nextBuffer()
+  with timings.phase("growth"):
+    if USE_GROWTH_TABLE:
+      growthFromTable(potential, growthTable, growthSlopes, potential, tableIndexArr, tableScratchArr)
+      return addGrowth(universeArr, potential, timeFrac, out)
+    return updateInto(universeArr, potential, growthMean, growthStdDev, timeFrac, out)
 
 if __name__ == "__main__":
   initArrVal()
+  if HISTORY_PATH != None:
+    openHistory()
   canvasThread = threading.Thread(target=setCanvasThread)
   displayWindow()
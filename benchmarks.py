@@ -0,0 +1,234 @@
+import argparse
+import importlib
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+
+'''
+Headless benchmarks of the step functions and render paths of every script.
+
+Every case is timed on square universes of every size in [SIZES] (or --size):
+  - conway: `life_rules.stepArray` (what `Conways_game_of_life_tkinter.py` runs), the bitpacked engine, and dirty tiles on the random universe (reset before every step, so every call does the same work) and on a board with one blinker.
+  - maze: the Maze rule through `maze_tkinter.stepArray`.
+  - ltl: one Larger Than Life step for every kernel type, radius in [LTL_RADII] and neighbour count method.
+  - lenia: one Lenia step for every kernel size in [LENIA_KERNEL_SIZES], with and without the FFT, in float64 and float32.
+  - render: the work of `setCanvasThread` (`tk_renderer.TkGridRenderer.submit` without the canvas, for binary and continuous universes), `enlargeArrByPixWth` of the dearpygui script, and the colour and upscale stages of the video.
+A case whose module can't be imported (dearpygui, OpenCV, ...) is reported as skipped instead of failing the run.
+
+Every universe is random with a fixed seed. A case is run once to warm up, then timeit-style: it is repeated until a run takes at least [MIN_SECONDS], and that is done [REPEATS] times. The median and the best time per call are reported, along with the nanoseconds per cell.
+
+The results are written as JSON with the git commit, the Python and NumPy versions and the machine, so runs on different commits can be compared:
+  python benchmarks.py --output before.json
+  python benchmarks.py --output after.json --compare before.json
+--compare prints old/new for every case that is in both files (more than 1 is faster).
+'''
+
+SIZES = [64, 256, 1024]
+REPEATS = 5
+MIN_SECONDS = 0.05
+LTL_RADII = [1, 5, 10]
+LENIA_KERNEL_SIZES = [5, 13, 25]
+PIXEL_WIDTH = 4
+
+def randomBinary(size: int, density: float = 0.3):
+  np.random.seed(0)
+  return (np.random.random((size, size)) < density).astype(np.int8)
+
+def randomContinuous(size: int, dtype=np.float64):
+  np.random.seed(0)
+  return np.random.random((size, size)).astype(dtype)
+
+def conwayCases(size: int):
+  import life_rules
+  import bitpacked_life
+  import dirty_tiles
+  table = life_rules.compileRule("B3/S23")
+  arr = randomBinary(size)
+  packed = bitpacked_life.packGrid(arr)
+  rule = lambda cells, neighbours: life_rules.applyRule(table, cells, neighbours)
+  stepper = dirty_tiles.DirtyTileStepper(arr, rule)
+  def dirtyTiles():
+    # every call steps the same seeded soup with every tile active, the worst case of dirty tiles
+    stepper.reset(arr)
+    stepper.step()
+  # a lone blinker keeps the same few tiles active however many times it is stepped, the best case
+  quietArr = np.zeros((size, size), dtype=np.int8)
+  quietArr[size//2, size//2-1:size//2+2] = 1
+  quietStepper = dirty_tiles.DirtyTileStepper(quietArr, rule)
+  return [
+    ("conway/lookup", {}, lambda: life_rules.stepArray(arr, table)),
+    ("conway/bitpacked", {}, lambda: bitpacked_life.stepPacked(packed, size)),
+    ("conway/dirtyTiles", {}, dirtyTiles),
+    ("conway/dirtyTilesQuiet", {}, quietStepper.step),
+  ]
+
+def mazeCases(size: int):
+  import maze_tkinter
+  arr = randomBinary(size, 0.1)
+  return [("maze/step", {}, lambda: maze_tkinter.stepArray(arr))]
+
+def ltlCases(size: int):
+  import larger_than_life
+  import ltl_batch
+  arr = randomBinary(size, 0.5)
+  cases = []
+  for kType in ("Moore", "von Neumann", "circular"):
+    for r in LTL_RADII:
+      if 2*r+1 > size:
+        continue
+      kernel = larger_than_life.buildKernel(kType, r, True)
+      for method in ("correlate", "fft", "sat", "jit"):
+        counter = ltl_batch.makeCounter({"method": method, "kernelType": kType, "radius": r, "includeMiddle": True}, kernel, arr.shape)
+        step = lambda counter=counter, r=r: larger_than_life.applyRule(arr, counter(arr), [2*r, 4*r], [2*r, 3*r])
+        cases.append((f"ltl/{kType}/{method}", {"radius": r}, step))
+  return cases
+
+def leniaCases(size: int):
+  import Lenia
+  import fft_convolution
+  cases = []
+  for kSize in LENIA_KERNEL_SIZES:
+    if 2*kSize+1 > size:
+      continue
+    kernel = Lenia.buildKernel(kSize)
+    for dtype in (np.float64, np.float32):
+      arr = randomContinuous(size, dtype)
+      out = np.empty_like(arr)
+      spectrum = fft_convolution.kernelSpectrum(kernel, arr.shape, dtype)
+      fftStep = lambda arr=arr, out=out, spectrum=spectrum: Lenia.updateInto(arr, fft_convolution.correlateWrap(arr, spectrum), 0.135, 0.015, 10, out)
+      cases.append(("lenia/fft", {"kernelSize": kSize, "dtype": np.dtype(dtype).name}, fftStep))
+      cases.append(("lenia/correlate", {"kernelSize": kSize, "dtype": np.dtype(dtype).name}, lambda arr=arr, kernel=kernel: Lenia.stepArray(arr, kernel, 0.135, 0.015, 10)))
+  return cases
+
+def tkRenderCases(size: int):
+  import tk_renderer
+  binaryArr = randomBinary(size)
+  continuousArr = randomContinuous(size)
+  grey = np.empty((size, size), dtype=np.uint8)
+  frame = np.empty((size*PIXEL_WIDTH, size*PIXEL_WIDTH), dtype=np.uint8)
+  # the same work as TkGridRenderer.submit, which needs a canvas
+  def binary():
+    np.take(tk_renderer.BINARY_PALETTE, binaryArr, out=grey, mode="clip")
+    tk_renderer.upscaleInto(grey, frame, PIXEL_WIDTH)
+  def continuous():
+    np.multiply(continuousArr, 255, out=grey, casting="unsafe")
+    tk_renderer.upscaleInto(grey, frame, PIXEL_WIDTH)
+  return [
+    ("render/tkSubmit", {"continuous": False, "pixelWidth": PIXEL_WIDTH}, binary),
+    ("render/tkSubmit", {"continuous": True, "pixelWidth": PIXEL_WIDTH}, continuous),
+  ]
+
+def dearpyguiRenderCases(size: int):
+  dpgScript = importlib.import_module("Conways_game_of_life_dearpygui")
+  # the texture buffers are module globals sized for ARR_W
+  dpgScript.ARR_W = size
+  dpgScript.PIXEL_WIDTH = PIXEL_WIDTH
+  dpgScript.textureArr = np.ones((size*PIXEL_WIDTH, size*PIXEL_WIDTH, 4), dtype=np.float32)
+  dpgScript.alphaArr = np.empty((size, size), dtype=np.float32)
+  arr = randomBinary(size)
+  return [("render/enlargeArrByPixWth", {"pixelWidth": PIXEL_WIDTH}, lambda: dpgScript.enlargeArrByPixWth(arr))]
+
+def videoRenderCases(size: int):
+  import Conways_game_of_life_video as video
+  arr = randomBinary(size)
+  s = video.SIZE_EXTENSION_FOR_VIDEO
+  colour = np.empty((size, size, 3), dtype=np.uint8)
+  img = np.empty((size*s, size*s, 3), dtype=np.uint8)
+  return [
+    ("render/videoColour", {}, lambda: video.colourFrame(arr, colour)),
+    ("render/videoUpscale", {"sizeExtension": s}, lambda: video.upscaleFrame(colour, img)),
+  ]
+
+CASE_GROUPS = {
+  "conway": [conwayCases],
+  "maze": [mazeCases],
+  "ltl": [ltlCases],
+  "lenia": [leniaCases],
+  "render": [tkRenderCases, dearpyguiRenderCases, videoRenderCases],
+}
+
+def timeFunction(function, repeats: int = REPEATS, minSeconds: float = MIN_SECONDS):
+  function()
+  number = 1
+  while True:
+    startTime = time.perf_counter()
+    for _ in range(number):
+      function()
+    elapsed = time.perf_counter() - startTime
+    if elapsed >= minSeconds:
+      break
+    number *= 2
+  times = [elapsed / number]
+  for _ in range(repeats-1):
+    startTime = time.perf_counter()
+    for _ in range(number):
+      function()
+    times.append((time.perf_counter() - startTime) / number)
+  return statistics.median(times), min(times), number
+
+def caseKey(result):
+  return json.dumps([result["name"], result["size"], result["params"]], sort_keys=True)
+
+def runBenchmarks(groups, sizes, repeats: int = REPEATS, minSeconds: float = MIN_SECONDS, log=None):
+  results = []
+  for group in groups:
+    for makeCases in CASE_GROUPS[group]:
+      for size in sizes:
+        try:
+          cases = makeCases(size)
+        except ImportError as e:
+          results.append({"name": f"{group}/{makeCases.__name__}", "size": size, "params": {}, "skipped": str(e)})
+          continue
+        for name, params, function in cases:
+          median, best, number = timeFunction(function, repeats, minSeconds)
+          result = {"name": name, "size": size, "params": params, "seconds": median, "bestSeconds": best, "calls": number, "nsPerCell": median / size**2 * 1e9}
+          results.append(result)
+          if log is not None:
+            log.write(f"{name} {size} {params}: {median*1e3:.3f} ms\n")
+  return results
+
+def environment():
+  try:
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    commit = None
+  return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor(), "system": platform.system()}
+
+def compareResults(old, new):
+  oldTimes = {caseKey(r): r["seconds"] for r in old["results"] if "seconds" in r}
+  rows = []
+  for r in new["results"]:
+    key = caseKey(r)
+    if "seconds" in r and key in oldTimes:
+      rows.append({"name": r["name"], "size": r["size"], "params": r["params"], "oldSeconds": oldTimes[key], "newSeconds": r["seconds"], "speedup": oldTimes[key] / r["seconds"]})
+  return rows
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark the step and render paths without a display.")
+  parser.add_argument("--group", nargs="+", default=list(CASE_GROUPS), choices=list(CASE_GROUPS))
+  parser.add_argument("--size", nargs="+", type=int, default=SIZES)
+  parser.add_argument("--repeats", type=int, default=REPEATS)
+  parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS)
+  parser.add_argument("--output", default=None, help="JSON file for the results, stdout by default")
+  parser.add_argument("--compare", default=None, help="JSON file of an earlier run")
+  args = parser.parse_args(argv)
+
+  report = {"environment": environment(), "results": runBenchmarks(args.group, args.size, args.repeats, args.min_seconds, sys.stderr)}
+  if args.output is None:
+    json.dump(report, sys.stdout, indent=1)
+    sys.stdout.write("\n")
+  else:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=1)
+  if args.compare is not None:
+    with open(args.compare) as f:
+      old = json.load(f)
+    for row in compareResults(old, report):
+      sys.stderr.write(f"{row['name']} {row['size']} {row['params']}: {row['oldSeconds']*1e3:.3f} ms -> {row['newSeconds']*1e3:.3f} ms ({row['speedup']:.2f}x)\n")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,55 @@
+import collections
+import hashlib
+import numpy as np
+
+'''
+Detects when a binary universe (Game of Life, Maze, Larger Than Life) has settled into a still life or an oscillator.
+
+Every generation passed to `update` is packed with np.packbits and hashed to 64 bits (blake2b). The hashes of the last [maxPeriod] generations are kept in a table that maps each hash to the last generation it was seen at, so memory stays bounded however long the run is. When the hash of a new generation is already in the table, the universe repeats itself:
+  - period: the number of generations between the two equal states (1 for a still life, and for a universe that died).
+  - cycleStart: the first generation of the cycle.
+Cycles longer than [maxPeriod] are not detected.
+
+`update` returns True only for the generation the cycle is found at, so a play loop can pause once and the user can still play on from there. The generations are counted from the last `reset`.
+'''
+
+DEFAULT_MAX_PERIOD = 64
+
+def stateHash(arr):
+  return int.from_bytes(hashlib.blake2b(np.packbits(np.asarray(arr) != 0).tobytes(), digest_size=8).digest(), "little")
+
+class CycleDetector:
+  def __init__(self, maxPeriod: int = DEFAULT_MAX_PERIOD):
+    self.maxPeriod = maxPeriod
+    self.reset()
+
+  def reset(self, generation: int = 0):
+    # [generation] is the generation number of the next state passed to `update`
+    self.generation = generation
+    self.recent = collections.deque()
+    self.seen = {}
+    self.period = None
+    self.cycleStart = None
+
+  def update(self, arr):
+    h = stateHash(arr)
+    found = False
+    if self.period is None and h in self.seen:
+      self.cycleStart = self.seen[h]
+      self.period = self.generation - self.cycleStart
+      found = True
+    self.seen[h] = self.generation
+    self.recent.append(h)
+    if len(self.recent) > self.maxPeriod:
+      old = self.recent.popleft()
+      if self.seen[old] == self.generation - self.maxPeriod:
+        del self.seen[old]
+    self.generation += 1
+    return found
+
+  def describe(self):
+    if self.period is None:
+      return "No cycle found"
+    if self.period == 1:
+      return f"Still life since generation {self.cycleStart}"
+    return f"Period {self.period} oscillator since generation {self.cycleStart}"
@@ -0,0 +1,73 @@
+import numpy as np
+
+'''
+Tiled stepping for rules that only look at the eight neighbours of a cell (Conway's Game of Life, Maze, ...), which skips the parts of the universe that didn't change.
+
+The [H] x [W] looped array is split into [tileSize] x [tileSize] tiles (the tiles on the last row and column may be smaller). A tile can only change if it, or one of its eight neighbouring tiles, changed in the previous generation, so only those tiles are recomputed. The active tiles are gathered with a one cell halo (wrapping around the edges) into a single (n, tileSize+2, tileSize+2) stack, counted and updated in one vectorised pass, and written back.
+
+Two buffers are used. A tile that is skipped is the same in the last two generations, so it is already correct in the buffer that gets overwritten, and nothing has to be copied. After the universe is changed from outside, call `reset` so every tile is recomputed once.
+
+[rule] is called as rule(cells, neighbours) and returns the next state of [cells], like the `applyRule` functions of the scripts.
+'''
+
+DEFAULT_TILE_SIZE = 32
+
+class DirtyTileStepper:
+  def __init__(self, arr, rule, tileSize: int = DEFAULT_TILE_SIZE):
+    self.rule = rule
+    self.tileSize = tileSize
+    h, w = arr.shape
+    self.tilesY = -(-h // tileSize)
+    self.tilesX = -(-w // tileSize)
+
+    # rows/columns of every tile with a one cell halo, wrapped around the edges
+    offsets = np.arange(-1, tileSize+1)
+    self.rowIndex = (np.arange(self.tilesY)[:, None]*tileSize + offsets) % h
+    self.colIndex = (np.arange(self.tilesX)[:, None]*tileSize + offsets) % w
+    inner = np.arange(tileSize)
+    self.rowValid = np.arange(self.tilesY)[:, None]*tileSize + inner < h
+    self.colValid = np.arange(self.tilesX)[:, None]*tileSize + inner < w
+    self.reset(arr)
+
+  def reset(self, arr):
+    self.arr = arr
+    self.spare = arr.copy()
+    self.changed = np.ones((self.tilesY, self.tilesX), dtype=bool)
+
+  def activeTiles(self):
+    c = self.changed
+    active = c.copy()
+    for dy in (-1, 0, 1):
+      for dx in (-1, 0, 1):
+        if dy or dx:
+          active |= np.roll(c, (dy, dx), axis=(0, 1))
+    return active
+
+  def step(self):
+    tys, txs = np.nonzero(self.activeTiles())
+    nextArr = self.spare
+    changed = np.zeros_like(self.changed)
+    if len(tys):
+      rows = self.rowIndex[tys]
+      cols = self.colIndex[txs]
+      stack = self.arr[rows[:, :, None], cols[:, None, :]]
+
+      neighbours = np.zeros((len(tys), self.tileSize, self.tileSize), dtype=np.int8)
+      for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+          if dy != 1 or dx != 1:
+            neighbours += stack[:, dy:dy+self.tileSize, dx:dx+self.tileSize]
+      cells = stack[:, 1:-1, 1:-1]
+      newCells = self.rule(cells, neighbours)
+
+      # the part of a tile past the edge of the universe is only used as halo
+      valid = self.rowValid[tys][:, :, None] & self.colValid[txs][:, None, :]
+      changed[tys, txs] = ((newCells != cells) & valid).any(axis=(1, 2))
+      innerRows = np.broadcast_to(rows[:, 1:-1, None], valid.shape)
+      innerCols = np.broadcast_to(cols[:, None, 1:-1], valid.shape)
+      nextArr[innerRows[valid], innerCols[valid]] = newCells[valid]
+
+    self.spare = self.arr
+    self.arr = nextArr
+    self.changed = changed
+    return nextArr
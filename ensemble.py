@@ -0,0 +1,138 @@
+import numpy as np
+import scipy.ndimage
+import fft_convolution
+import larger_than_life
+import Lenia
+import kernel_cache
+
+'''
+Ensembles: many independent universes of the same size and kernel, held as one (B, ARR_W, ARR_W) stack and stepped together.
+
+Every member has its own seed, and the rule parameters can be given once for every member or once per member:
+  - `LargerThanLifeEnsemble`: survival and birth ranges as [min, max] or a list of B of them, and alive denominators.
+  - `LeniaEnsemble`: growth means, growth s.d.s and time fractions.
+A step is one pass over the whole stack: one batched FFT correlation (see `fft_convolution.py`), or `scipy.ndimage.correlate` with the kernel given a batch axis of size 1 when [method] is "correlate", and one vectorised rule over the stack. So the Python overhead of a step is paid once for the B members, which is most of the cost of small universes.
+
+Kernel spectra are kept in an LRU cache keyed by the contents of the kernel (see `kernel_cache.py`), so ensembles built one after the other with the same kernel and width share one.
+
+`statistics` reduces every member over its cells and returns arrays with one value per member, `summary` reduces those over the members.
+
+  ensemble = LargerThanLifeEnsemble(kernel, seeds=range(64), aliveDenominators=4, surRanges=[34, 58], birthRanges=[34, 45], width=64)
+  ensemble.run(500)
+  print(ensemble.statistics()["population"])
+'''
+
+kernelCache = kernel_cache.KernelCache()
+
+def kernelSpectrum(kernel, width: int, dtype=np.float64):
+  key = kernel_cache.arrayKey("spectrum", kernel, (width, width), dtype)
+  return kernelCache.get(key, lambda: fft_convolution.kernelSpectrum(kernel, (width, width), dtype))
+
+def memberValues(values, members: int, dtype=np.float64):
+  # one value for every member: a single value is repeated
+  return np.broadcast_to(np.asarray(values, dtype=dtype), (members,)).copy()
+
+def memberRanges(ranges, members: int):
+  # (B, 2) array of [min, max] ranges, a single range is repeated
+  return np.broadcast_to(np.asarray(ranges, dtype=np.int32).reshape(-1, 2), (members, 2)).copy()
+
+def summarise(stats):
+  return {name: {"mean": float(values.mean()), "min": float(values.min()), "max": float(values.max())} for name, values in stats.items()}
+
+class LargerThanLifeEnsemble:
+  def __init__(self, kernel, seeds, aliveDenominators, surRanges, birthRanges, width: int = larger_than_life.ARR_W, method: str = "fft"):
+    seeds = list(seeds)
+    members = len(seeds)
+    aliveDenominators = memberValues(aliveDenominators, members)
+    self.universes = np.stack([larger_than_life.randomUniverse(seed, alive, width) for seed, alive in zip(seeds, aliveDenominators)])
+    self.previous = self.universes.copy()
+    self.kernel = np.asarray(kernel)
+    self.method = method
+    if method == "fft":
+      self.spectrum = kernelSpectrum(self.kernel, width)
+    surRanges = memberRanges(surRanges, members)
+    birthRanges = memberRanges(birthRanges, members)
+    self.surMin, self.surMax = (surRanges[:, i, None, None] for i in (0, 1))
+    self.birthMin, self.birthMax = (birthRanges[:, i, None, None] for i in (0, 1))
+    self.generation = 0
+
+  def countNeighbours(self):
+    if self.method == "fft":
+      return np.rint(fft_convolution.correlateWrap(self.universes, self.spectrum)).astype(np.int32)
+    return scipy.ndimage.correlate(self.universes, self.kernel[None], output=np.int32, mode="wrap")
+
+  def step(self):
+    neighboursArr = self.countNeighbours()
+    survive = (neighboursArr >= self.surMin) & (neighboursArr <= self.surMax)
+    birth = (neighboursArr >= self.birthMin) & (neighboursArr <= self.birthMax)
+    self.previous = self.universes
+    self.universes = np.where(self.universes, survive, birth).astype(np.int8)
+    self.generation += 1
+    return self.universes
+
+  def run(self, generations: int):
+    for _ in range(generations):
+      self.step()
+    return self.universes
+
+  def statistics(self):
+    population = self.universes.sum(axis=(1, 2), dtype=np.int64)
+    return {
+      "population": population,
+      "density": population / self.universes[0].size,
+      "changed": np.count_nonzero(self.universes != self.previous, axis=(1, 2)),
+    }
+
+  def summary(self):
+    return summarise(self.statistics())
+
+class LeniaEnsemble:
+  def __init__(self, kernel, seeds, growthMeans, growthStdDevs, timeFracs, width: int = Lenia.ARR_W, dtype=np.float64):
+    seeds = list(seeds)
+    members = len(seeds)
+    self.buffers = [np.empty((members, width, width), dtype=dtype) for _ in range(2)]
+    for i, seed in enumerate(seeds):
+      # the same universe as `Lenia.initArrVal` with this seed
+      np.random.seed(seed)
+      self.buffers[0][i] = np.random.random((width, width))
+    self.buffers[1][...] = self.buffers[0]
+    self.universes = self.buffers[0]
+    self.previous = self.buffers[1]
+    self.spectrum = kernelSpectrum(np.asarray(kernel), width, dtype)
+    self.means = memberValues(growthMeans, members, dtype)[:, None, None]
+    self.sds = memberValues(growthStdDevs, members, dtype)[:, None, None]
+    self.timeFracs = memberValues(timeFracs, members, dtype)[:, None, None]
+    self.generation = 0
+
+  def step(self):
+    potential = fft_convolution.correlateWrap(self.universes, self.spectrum)
+    out = self.previous
+    self.previous = self.universes
+    self.universes = Lenia.updateInto(self.previous, potential, self.means, self.sds, self.timeFracs, out)
+    self.generation += 1
+    return self.universes
+
+  def run(self, generations: int):
+    for _ in range(generations):
+      self.step()
+    return self.universes
+
+  def statistics(self):
+    mass = self.universes.sum(axis=(1, 2))
+    return {
+      "mass": mass,
+      "meanValue": mass / self.universes[0].size,
+      "maxValue": self.universes.max(axis=(1, 2)),
+      "meanChange": np.abs(self.universes - self.previous).mean(axis=(1, 2)),
+    }
+
+  def summary(self):
+    return summarise(self.statistics())
+
+if __name__ == "__main__":
+  bugs = LargerThanLifeEnsemble(larger_than_life.buildKernel("Moore", 5, True), range(16), 4, [34, 58], [34, 45], width=100)
+  bugs.run(100)
+  print("Bugs:", bugs.summary())
+  lenia = LeniaEnsemble(Lenia.buildKernel(10), range(16), np.linspace(0.1, 0.2, 16), 0.015, 10)
+  lenia.run(100)
+  print("Lenia:", lenia.summary())
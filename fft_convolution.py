@@ -0,0 +1,30 @@
+import numpy as np
+import scipy.fft
+
+'''
+Periodic (looped) correlation through real FFTs.
+
+`scipy.ndimage.correlate(arr, kernel, mode="wrap")` costs O(N^2 * R^2) for an N x N array and a (2R+1) x (2R+1) kernel. Since the arrays are looped, the same result is a circular convolution, which the FFT gives exactly (up to rounding) in O(N^2 log N) whatever the radius.
+
+The kernel is folded onto the array shape once (entries that fall outside the array wrap around, like they do with mode="wrap") and its spectrum is kept, so every step is one rfft2 of the universe, one multiplication and one irfft2. The transforms run on [FFT_WORKERS] threads (-1 means every core).
+
+Integer counts (for example the neighbour counts of Larger Than Life) come back as floats with rounding errors far below 0.5, so they are rounded with np.rint.
+'''
+
+FFT_WORKERS = -1
+
+def kernelSpectrum(kernel, shape, dtype=np.float64):
+  kh, kw = kernel.shape
+  # correlate puts kernel[kh//2, kw//2] on the cell itself, so entry (i, j) is moved to offset (kh//2-i, kw//2-j)
+  rows = (kh//2 - np.arange(kh)) % shape[0]
+  cols = (kw//2 - np.arange(kw)) % shape[1]
+  folded = np.zeros(shape, dtype=dtype)
+  np.add.at(folded, (rows[:, None], cols[None, :]), kernel)
+  return scipy.fft.rfft2(folded, workers=FFT_WORKERS)
+
+def correlateWrap(arr, spectrum):
+  # [arr] may have leading batch axes, the transforms are over the last two
+  shape = arr.shape[-2:]
+  arrSpectrum = scipy.fft.rfft2(arr, workers=FFT_WORKERS)
+  arrSpectrum *= spectrum
+  return scipy.fft.irfft2(arrSpectrum, s=shape, workers=FFT_WORKERS, overwrite_x=True)
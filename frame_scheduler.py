@@ -0,0 +1,79 @@
+import collections
+import time
+
+'''
+Paces the play loops of the scripts.
+
+The simulation rate and the display rate are separate: the loop sleeps (on the monotonic clock, without spinning) until the next step is due, and after every step it asks `shouldRender` whether the new generation should be drawn. A generation is not drawn when the display rate is already reached, or when the renderer is still busy with the last one, so a slow renderer skips frames instead of slowing the simulation down.
+
+A rate of None means "as fast as possible". If the loop falls more than one period behind (a slow step, or the play loop was paused) the schedule starts again from now instead of running a burst of steps to catch up.
+
+`rates` returns the achieved steps per second and frames per second over the last [window] seconds.
+'''
+
+class FrameScheduler:
+  def __init__(self, stepsPerSec: float = None, framesPerSec: float = None, window: float = 2):
+    self.stepPeriod = 1/stepsPerSec if stepsPerSec else 0
+    self.framePeriod = 1/framesPerSec if framesPerSec else 0
+    self.window = window
+    self.stepTimes = collections.deque()
+    self.frameTimes = collections.deque()
+    self.skippedFrames = 0
+    self.lastReport = time.monotonic()
+    self.reset()
+
+  def reset(self):
+    now = time.monotonic()
+    self.nextStep = now
+    self.nextFrame = now
+
+  def waitForStep(self):
+    now = time.monotonic()
+    if now < self.nextStep:
+      time.sleep(self.nextStep - now)
+      now = self.nextStep
+    elif now > self.nextStep + self.stepPeriod:
+      self.nextStep = now
+    self.nextStep += self.stepPeriod
+
+  def stepDone(self):
+    self.record(self.stepTimes)
+
+  def shouldRender(self, rendererBusy: bool = False):
+    now = time.monotonic()
+    if rendererBusy or now < self.nextFrame:
+      self.skippedFrames += 1
+      return False
+    self.nextFrame += self.framePeriod
+    if self.nextFrame < now:
+      self.nextFrame = now + self.framePeriod
+    self.record(self.frameTimes)
+    return True
+
+  def record(self, times):
+    now = time.monotonic()
+    times.append(now)
+    while times[0] < now - self.window:
+      times.popleft()
+
+  def rate(self, times):
+    now = time.monotonic()
+    while times and times[0] < now - self.window:
+      times.popleft()
+    if len(times) < 2:
+      return 0.0
+    return (len(times)-1) / (times[-1] - times[0]) if times[-1] > times[0] else 0.0
+
+  def rates(self):
+    return self.rate(self.stepTimes), self.rate(self.frameTimes)
+
+  def reportDue(self, interval: float = 1):
+    now = time.monotonic()
+    if now - self.lastReport < interval:
+      return False
+    self.lastReport = now
+    return True
+
+  def report(self):
+    stepsPerSec, framesPerSec = self.rates()
+    return f"Steps per second: {stepsPerSec:.1f}, frames per second: {framesPerSec:.1f}, skipped frames: {self.skippedFrames}"
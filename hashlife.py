@@ -0,0 +1,210 @@
+import numpy as np
+
+'''
+Hashlife for Conway's Game of Life (B3/S23).
+
+The universe is a quadtree. A node of level k is a 2^k x 2^k square made of four level k-1 children (nw, ne, sw, se) and level 0 nodes are single cells. Nodes are hash-consed: `join` always returns the same object for the same four children, so equal squares anywhere in the universe (or at any time) are stored once.
+
+The RESULT of a level k node is its centre 2^(k-1) x 2^(k-1) square advanced by 2^j generations (j <= k-2). Those results are memoized, so a pattern that repeats in space or in time is only ever computed once, which lets a universe be advanced by huge powers of two.
+
+Unlike the other scripts, the universe is infinite (it does not loop around). The root is kept centred on (0, 0) and is grown with empty borders before every jump so nothing can fall off the edge.
+
+The node store is bounded by [maxNodes]. When a jump leaves more nodes than that, every node that can't be reached from the root is dropped, along with the results that refer to dropped nodes.
+'''
+
+DEFAULT_MAX_NODES = 4_000_000
+
+class Node:
+  __slots__ = ("k", "nw", "ne", "sw", "se", "n")
+
+  def __init__(self, k, nw, ne, sw, se, n):
+    self.k = k
+    self.nw = nw
+    self.ne = ne
+    self.sw = sw
+    self.se = se
+    self.n = n
+
+OFF = Node(0, None, None, None, None, 0)
+ON = Node(0, None, None, None, None, 1)
+
+class HashlifeStore:
+  def __init__(self, maxNodes: int = DEFAULT_MAX_NODES):
+    self.maxNodes = maxNodes
+    self.nodes = {}
+    self.results = {}
+    self.emptyNodes = [OFF]
+    self.hits = 0
+    self.misses = 0
+
+  def join(self, nw, ne, sw, se):
+    key = (id(nw), id(ne), id(sw), id(se))
+    node = self.nodes.get(key)
+    if node is None:
+      node = Node(nw.k+1, nw, ne, sw, se, nw.n + ne.n + sw.n + se.n)
+      self.nodes[key] = node
+    return node
+
+  def empty(self, k: int):
+    while len(self.emptyNodes) <= k:
+      e = self.emptyNodes[-1]
+      self.emptyNodes.append(self.join(e, e, e, e))
+    return self.emptyNodes[k]
+
+  def centre(self, m):
+    # same square, surrounded by an empty border, one level up
+    z = self.empty(m.k-1)
+    return self.join(
+      self.join(z, z, z, m.nw), self.join(z, z, m.ne, z),
+      self.join(z, m.sw, z, z), self.join(m.se, z, z, z))
+
+  def isPadded(self, m):
+    # every live cell is within the centre half of the centre half
+    return (m.nw.n == m.nw.se.se.n and m.ne.n == m.ne.sw.sw.n and
+      m.sw.n == m.sw.ne.ne.n and m.se.n == m.se.nw.nw.n)
+
+  def life4x4(self, m):
+    cells = 0
+    for y, row in enumerate(((m.nw.nw, m.nw.ne, m.ne.nw, m.ne.ne), (m.nw.sw, m.nw.se, m.ne.sw, m.ne.se),
+        (m.sw.nw, m.sw.ne, m.se.nw, m.se.ne), (m.sw.sw, m.sw.se, m.se.sw, m.se.se))):
+      for x, c in enumerate(row):
+        cells |= c.n << (4*y + x)
+    out = []
+    for y in (1, 2):
+      for x in (1, 2):
+        count = 0
+        for dy in (-1, 0, 1):
+          for dx in (-1, 0, 1):
+            if dy or dx:
+              count += (cells >> (4*(y+dy) + x+dx)) & 1
+        alive = (cells >> (4*y + x)) & 1
+        out.append(ON if count == 3 or (count == 2 and alive) else OFF)
+    return self.join(*out)
+
+  def successor(self, m, j: int):
+    # centre 2^(k-1) square of [m] advanced by 2^j generations
+    if m.n == 0:
+      return m.nw
+    key = (id(m), j)
+    cached = self.results.get(key)
+    if cached is not None:
+      self.hits += 1
+      return cached[1]
+    self.misses += 1
+
+    if m.k == 2:
+      s = self.life4x4(m)
+    else:
+      join = self.join
+      nw, ne, sw, se = m.nw, m.ne, m.sw, m.se
+      c1 = self.successor(nw, j)
+      c2 = self.successor(join(nw.ne, ne.nw, nw.se, ne.sw), j)
+      c3 = self.successor(ne, j)
+      c4 = self.successor(join(nw.sw, nw.se, sw.nw, sw.ne), j)
+      c5 = self.successor(join(nw.se, ne.sw, sw.ne, se.nw), j)
+      c6 = self.successor(join(ne.sw, ne.se, se.nw, se.ne), j)
+      c7 = self.successor(sw, j)
+      c8 = self.successor(join(sw.ne, se.nw, sw.se, se.sw), j)
+      c9 = self.successor(se, j)
+      if j < m.k-2:
+        s = join(
+          join(c1.se, c2.sw, c4.ne, c5.nw), join(c2.se, c3.sw, c5.ne, c6.nw),
+          join(c4.se, c5.sw, c7.ne, c8.nw), join(c5.se, c6.sw, c8.ne, c9.nw))
+      else:
+        s = join(
+          self.successor(join(c1, c2, c4, c5), j), self.successor(join(c2, c3, c5, c6), j),
+          self.successor(join(c4, c5, c7, c8), j), self.successor(join(c5, c6, c8, c9), j))
+
+    # the node is kept in the value so its id can't be reused while the entry exists
+    self.results[key] = (m, s)
+    return s
+
+  def collect(self, roots):
+    keep = {}
+    stack = list(roots) + self.emptyNodes[1:]
+    while stack:
+      m = stack.pop()
+      if m.k == 0:
+        continue
+      key = (id(m.nw), id(m.ne), id(m.sw), id(m.se))
+      if key in keep:
+        continue
+      keep[key] = m
+      stack.extend((m.nw, m.ne, m.sw, m.se))
+    self.nodes = keep
+    alive = {id(m) for m in keep.values()}
+    self.results = {key: val for key, val in self.results.items() if key[0] in alive and id(val[1]) in alive}
+
+  def fromArray(self, arr, k: int):
+    # [arr] is placed at the top left corner of a level [k] square
+    if not arr.any():
+      return self.empty(k)
+    if k == 0:
+      return ON
+    half = 1 << (k-1)
+    return self.join(
+      self.fromArray(arr[:half, :half], k-1), self.fromArray(arr[:half, half:], k-1),
+      self.fromArray(arr[half:, :half], k-1), self.fromArray(arr[half:, half:], k-1))
+
+  def paint(self, m, out, top: int, left: int):
+    # writes the cells of [m], whose top left corner is at (top, left) of [out]
+    if m.n == 0:
+      return
+    size = 1 << m.k
+    if top >= out.shape[0] or left >= out.shape[1] or top+size <= 0 or left+size <= 0:
+      return
+    if m.k == 0:
+      out[top, left] = 1
+      return
+    half = size >> 1
+    self.paint(m.nw, out, top, left)
+    self.paint(m.ne, out, top, left+half)
+    self.paint(m.sw, out, top+half, left)
+    self.paint(m.se, out, top+half, left+half)
+
+class HashlifeUniverse:
+  def __init__(self, arr, maxNodes: int = DEFAULT_MAX_NODES, store: HashlifeStore = None):
+    # passing the store of an earlier universe keeps its nodes and memoized results
+    self.store = store if store != None else HashlifeStore(maxNodes)
+    self.shape = arr.shape
+    self.generation = 0
+    k = 2
+    while (1 << k) < max(arr.shape):
+      k += 1
+    self.root = self.store.fromArray(np.asarray(arr) != 0, k)
+    # universe coordinates of arr[0, 0], the root is centred on (0, 0)
+    self.origin = -(1 << (k-1))
+
+  def population(self):
+    return self.root.n
+
+  def advancePow2(self, j: int):
+    store = self.store
+    root = self.root
+    while root.k < j+3 or not store.isPadded(root):
+      root = store.centre(root)
+    # one more border so the pattern can grow by 2^j cells in every direction
+    root = store.successor(store.centre(root), j)
+    self.root = root
+    self.generation += 1 << j
+    if len(store.nodes) > store.maxNodes:
+      store.collect([root])
+
+  def advance(self, generations: int):
+    j = 0
+    while generations:
+      if generations & 1:
+        self.advancePow2(j)
+      generations >>= 1
+      j += 1
+
+  def toArray(self, top: int = None, left: int = None, height: int = None, width: int = None):
+    # defaults to the window the universe was created from
+    top = self.origin if top is None else top
+    left = self.origin if left is None else left
+    height = self.shape[0] if height is None else height
+    width = self.shape[1] if width is None else width
+    out = np.zeros((height, width), dtype=np.int8)
+    rootCorner = -(1 << (self.root.k-1))
+    self.store.paint(self.root, out, rootCorner-top, rootCorner-left)
+    return out
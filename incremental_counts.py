@@ -0,0 +1,53 @@
+import numpy as np
+import scipy.ndimage
+
+'''
+Neighbour counts kept up to date from the cells that changed, for Larger Than Life runs with large kernels where few cells flip every generation.
+
+The counts of the last generation are kept. For a new generation, the cells that differ from the last one are found, and every flipped cell adds its kernel stamp (+kernel if it was born, -kernel if it died) to the counts around it, with np.add.at over the flat indices (looping around the edges like mode="wrap"). That costs O(flipped cells * kernel area) instead of O(cells * kernel area) for a full `scipy.ndimage.correlate`.
+
+When more than [maxFlipFraction] of the cells flipped (or on the first call, or when the universe changed size), the stamps would cost more than starting over, so the counts are recomputed with [fullCount] (`scipy.ndimage.correlate` by default).
+
+The counts are the same as the correlate path. The returned array is the one that is kept, so it must not be changed by the caller.
+'''
+
+DEFAULT_MAX_FLIP_FRACTION = 0.05
+
+class IncrementalCounter:
+  def __init__(self, kernel, maxFlipFraction: float = DEFAULT_MAX_FLIP_FRACTION, fullCount=None):
+    self.kernel = np.asarray(kernel)
+    self.maxFlipFraction = maxFlipFraction
+    self.fullCount = fullCount or (lambda arr: scipy.ndimage.correlate(arr, self.kernel, output=np.int32, mode="wrap"))
+    kh, kw = self.kernel.shape
+    ys, xs = np.nonzero(self.kernel)
+    # a cell at (y, x) is counted by the cells at (y - dy, x - dx)
+    self.dy = ys - kh//2
+    self.dx = xs - kw//2
+    self.weights = self.kernel[ys, xs].astype(np.int32)
+    self.counts = None
+    self.previous = None
+    self.fullRecomputes = 0
+    self.incrementalUpdates = 0
+
+  def reset(self, arr):
+    self.counts = self.fullCount(arr).astype(np.int32, copy=False)
+    self.previous = arr.copy()
+    self.fullRecomputes += 1
+
+  def count(self, arr):
+    if self.counts is None or self.counts.shape != arr.shape:
+      self.reset(arr)
+      return self.counts
+    fy, fx = np.nonzero(arr != self.previous)
+    if len(fy) > self.maxFlipFraction * arr.size:
+      self.reset(arr)
+      return self.counts
+    if len(fy):
+      h, w = arr.shape
+      deltas = arr[fy, fx].astype(np.int32) - self.previous[fy, fx]
+      rows = (fy[:, None] - self.dy) % h
+      cols = (fx[:, None] - self.dx) % w
+      np.add.at(self.counts.ravel(), (rows*w + cols).ravel(), (deltas[:, None] * self.weights).ravel())
+      self.previous[fy, fx] = arr[fy, fx]
+    self.incrementalUpdates += 1
+    return self.counts
@@ -0,0 +1,123 @@
+import collections
+import contextlib
+import csv
+import json
+import os
+import time
+import numpy as np
+
+'''
+Per-phase timings for the play loops.
+
+  timings = Instrumentation()
+  with timings.phase("convolution"):
+    ...
+Every phase keeps the durations of its last [window] runs (time.perf_counter_ns, monotonic), and `statistics` returns for every phase the count, the mean and the 50th, 95th and 99th percentiles in milliseconds over that window.
+
+When the instrumentation is disabled, `phase` returns one shared null context and `dumpIfDue` returns straight away, so the cost is one method call per phase.
+
+The timings can be read:
+  - through `statistics` and `report`.
+  - on the canvas, with `CanvasOverlay`, which redraws a text item every [intervalMs] milliseconds from the Tk event loop.
+  - from a file: `dumpIfDue` writes them to [dumpPath] every [dumpInterval] seconds. A ".json" path is overwritten with the latest statistics, any other path is read as CSV and gets one row per phase appended at every dump.
+'''
+
+DEFAULT_WINDOW = 1000
+DEFAULT_DUMP_INTERVAL = 10
+PERCENTILES = (50, 95, 99)
+NULL_PHASE = contextlib.nullcontext()
+
+class PhaseTimer:
+  __slots__ = ("samples", "start")
+
+  def __init__(self, samples):
+    self.samples = samples
+
+  def __enter__(self):
+    self.start = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, *args):
+    self.samples.append(time.perf_counter_ns() - self.start)
+
+class Instrumentation:
+  def __init__(self, enabled: bool = True, window: int = DEFAULT_WINDOW, dumpPath: str = None, dumpInterval: float = DEFAULT_DUMP_INTERVAL):
+    self.enabled = enabled
+    self.window = window
+    self.dumpPath = dumpPath
+    self.dumpInterval = dumpInterval
+    self.samples = {}
+    self.lastDump = time.monotonic()
+
+  def samplesFor(self, name: str):
+    samples = self.samples.get(name)
+    if samples is None:
+      samples = self.samples.setdefault(name, collections.deque(maxlen=self.window))
+    return samples
+
+  def phase(self, name: str):
+    if not self.enabled:
+      return NULL_PHASE
+    return PhaseTimer(self.samplesFor(name))
+
+  def record(self, name: str, nanoseconds: int):
+    if self.enabled:
+      self.samplesFor(name).append(nanoseconds)
+
+  def statistics(self):
+    stats = {}
+    for name, samples in list(self.samples.items()):
+      values = np.array(samples, dtype=np.float64) / 1e6
+      if len(values) == 0:
+        continue
+      stats[name] = {"count": len(values), "meanMs": float(values.mean())}
+      for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[name][f"p{p}Ms"] = float(value)
+    return stats
+
+  def report(self):
+    lines = []
+    for name, s in self.statistics().items():
+      lines.append(f"{name}: p50 {s['p50Ms']:.2f} ms, p95 {s['p95Ms']:.2f} ms, p99 {s['p99Ms']:.2f} ms")
+    return "\n".join(lines)
+
+  def dump(self, path: str = None):
+    path = path or self.dumpPath
+    stats = self.statistics()
+    if path.endswith(".json"):
+      with open(path, "w") as f:
+        json.dump({"time": time.time(), "phases": stats}, f, indent=1)
+      return
+    fields = ["time", "phase", "count", "meanMs"] + [f"p{p}Ms" for p in PERCENTILES]
+    newFile = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as f:
+      writer = csv.DictWriter(f, fieldnames=fields)
+      if newFile:
+        writer.writeheader()
+      now = time.time()
+      for name, s in stats.items():
+        writer.writerow({"time": now, "phase": name, **s})
+
+  def dumpIfDue(self):
+    if not self.enabled or self.dumpPath is None:
+      return
+    now = time.monotonic()
+    if now - self.lastDump >= self.dumpInterval:
+      self.lastDump = now
+      self.dump()
+
+DISABLED = Instrumentation(enabled=False)
+
+class CanvasOverlay:
+  # only use from the Tk main thread, like every other canvas call
+  def __init__(self, canvas, instrumentation, intervalMs: int = 500):
+    self.canvas = canvas
+    self.instrumentation = instrumentation
+    self.intervalMs = intervalMs
+    self.textId = canvas.create_text(4, 4, anchor="nw", fill="red", font=("TkFixedFont", 8), text="")
+    canvas.after(self.intervalMs, self.update)
+
+  def update(self):
+    self.canvas.itemconfigure(self.textId, text=self.instrumentation.report())
+    self.canvas.tag_raise(self.textId)
+    self.canvas.after(self.intervalMs, self.update)
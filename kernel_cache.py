@@ -0,0 +1,84 @@
+import collections
+import hashlib
+import sys
+import numpy as np
+
+'''
+A size-bounded LRU cache of kernels and of the data derived from them (FFT spectra, run lists, ...), so setting a kernel that was used before, or running a sweep that comes back to the same kernels over and over, doesn't rebuild them.
+
+  kernelCache = KernelCache(maxBytes=64 << 20)
+  key = kernelKey("spectrum", "Moore", 5, True, (ARR_W, ARR_W), np.float64)
+  spectrum = kernelCache.get(key, lambda: fft_convolution.kernelSpectrum(kernel, (ARR_W, ARR_W)))
+`get` returns the cached value and marks it as the most recently used, or calls [build], stores its result and returns it. Keys are made by `kernelKey` from (what, kernel type, radius, include middle, grid shape, dtype), or by `arrayKey` from the contents of a kernel given as an array (a blake2b digest of its bytes).
+
+The size of an entry is the nbytes of its arrays (summed over tuples and lists). When the cache holds more than [maxBytes], the least recently used entries are dropped, and a value bigger than the whole budget is returned without being stored. Arrays are made read-only before they are stored, since every caller gets the same array.
+
+hits, misses and evictions are counted, and `statistics` returns them with the number of entries and bytes held.
+'''
+
+DEFAULT_MAX_BYTES = 64 << 20
+
+def valueBytes(value):
+  if isinstance(value, np.ndarray):
+    return value.nbytes
+  if isinstance(value, (tuple, list)):
+    return sum(valueBytes(v) for v in value)
+  return sys.getsizeof(value)
+
+def freeze(value):
+  if isinstance(value, np.ndarray):
+    value.flags.writeable = False
+  elif isinstance(value, (tuple, list)):
+    for v in value:
+      freeze(v)
+  return value
+
+def kernelKey(kind: str, kernelType: str, radius: int, includeMiddle: bool = None, shape=None, dtype=None):
+  return (kind, kernelType, radius, includeMiddle, None if shape is None else tuple(shape), None if dtype is None else np.dtype(dtype).str)
+
+def arrayKey(kind: str, arr, shape=None, dtype=None):
+  arr = np.ascontiguousarray(arr)
+  digest = hashlib.blake2b(arr.tobytes(), digest_size=16).digest()
+  return (kind, arr.shape, arr.dtype.str, digest, None if shape is None else tuple(shape), None if dtype is None else np.dtype(dtype).str)
+
+class KernelCache:
+  def __init__(self, maxBytes: int = DEFAULT_MAX_BYTES):
+    self.maxBytes = maxBytes
+    self.entries = collections.OrderedDict()
+    self.bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key, build):
+    entry = self.entries.get(key)
+    if entry is not None:
+      self.entries.move_to_end(key)
+      self.hits += 1
+      return entry[0]
+    self.misses += 1
+    value = build()
+    size = valueBytes(value)
+    if size > self.maxBytes:
+      return value
+    self.entries[key] = (freeze(value), size)
+    self.bytes += size
+    self.evict(self.maxBytes)
+    return value
+
+  def evict(self, maxBytes: int):
+    while self.bytes > maxBytes:
+      _, (_, size) = self.entries.popitem(last=False)
+      self.bytes -= size
+      self.evictions += 1
+
+  def resize(self, maxBytes: int):
+    self.maxBytes = maxBytes
+    self.evict(maxBytes)
+
+  def clear(self):
+    self.entries.clear()
+    self.bytes = 0
+
+  def statistics(self):
+    return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries), "bytes": self.bytes, "maxBytes": self.maxBytes}
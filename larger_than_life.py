@@ -4,10 +4,18 @@ from tkinter import END, Canvas, Event, Frame, OptionMenu, StringVar, ttk
 import tkinter as tk
 import numpy as np
 import threading
-import time
 import os
-from PIL import ImageTk, Image
 import scipy.ndimage
+import tk_renderer
+import frame_scheduler
+import fft_convolution
+import summed_area
+import stencil_jit
+import incremental_counts
+import parallel_stepping
+import cycle_detection
+import instrumentation
+import kernel_cache
 
 '''
 Conway's Game of Life uses this kernel:
@@ -38,6 +46,17 @@ FORMAT: [KERNEL_RADIUS], [INCLUDE_MIDDLE], [SURVIVAL_RANGE], [BIRTH_RANGE], [KER
 GameOfLife: R1, M0, S2..3,    B3..3, NM   (start with the 50/50 density)
 Bugs:       R5, M1, S34..58,  B34..45, NM (start with the 25% alive)
 Majority:   R4, M1, S41..81,  B41..81,NM  (start with the 50/50 density)
+
+[NEIGHBOUR_COUNT_METHOD] chooses how the alive neighbours are counted:
+  - "correlate": `scipy.ndimage.correlate`, O(R^2) per cell.
+  - "fft": periodic correlation through real FFTs (see `fft_convolution.py`), O(log N) per cell whatever the radius. The spectrum of the kernel is computed once in `setkernel`.
+  - "sat": summed-area tables (see `summed_area.py`), O(1) per cell for "Moore" and "von Neumann" and O(R) per cell for "circular".
+  - "jit": sliding windows over the runs of ones of every kernel row (see `stencil_jit.py`), O(R) per cell for any kernel. Compiled with Numba when it is installed, NumPy otherwise. The run lists are compiled in `setkernel`.
+  - "incremental": the counts are kept from one generation to the next and only the stamps of the cells that flipped are added (see `incremental_counts.py`), O(flipped cells * kernel area). Falls back to "correlate" when more than [INCREMENTAL_MAX_FLIP_FRACTION] of the cells flipped.
+Kernels and their spectra are kept in an LRU cache of [KERNEL_CACHE_BYTES] (see `kernel_cache.py`), so setting a kernel that was set before doesn't build it again.
+If [PARALLEL_WORKERS] is more than 0, the universe is stepped in strips on that many processes (see `parallel_stepping.py`), always with "correlate".
+Every generation is checked for still lifes and oscillators (see `cycle_detection.py`). If [AUTO_PAUSE_ON_CYCLE] is True, the play loop pauses when one is found.
+If [INSTRUMENT] is True, the phases of every step (neighbour counting, rule, cycle check, waiting for the canvas thread, submit, paste) and the "Next Frame" button are timed (see `instrumentation.py`). [TIMINGS_OVERLAY] draws their percentiles on the canvas and [TIMINGS_PATH] dumps them to a CSV or JSON file every few seconds.
 '''
 
 ARR_W = 250
@@ -45,6 +64,15 @@ ARR_W_SQ = ARR_W**2
 PIXEL_WIDTH = 2
 CANVAS_W = ARR_W*PIXEL_WIDTH
 MAX_FRAME_PER_SEC = 6
+MAX_STEPS_PER_SEC = MAX_FRAME_PER_SEC
+NEIGHBOUR_COUNT_METHOD = "correlate"
+INCREMENTAL_MAX_FLIP_FRACTION = incremental_counts.DEFAULT_MAX_FLIP_FRACTION
+KERNEL_CACHE_BYTES = kernel_cache.DEFAULT_MAX_BYTES
+PARALLEL_WORKERS = 0
+AUTO_PAUSE_ON_CYCLE = True
+INSTRUMENT = False
+TIMINGS_OVERLAY = False
+TIMINGS_PATH = None
 RANGE_FOR_SURVIVAL = [0, ARR_W]
 RANGE_FOR_BIRTH = [0, ARR_W]
 SEED_DIGITS = 9
@@ -54,25 +82,40 @@ universeArr = None
 canvas: Canvas = None
 canvasThread = None
 playThread = None
-photoVar = None
-canvasImgVar = None
+renderer = None
+scheduler = frame_scheduler.FrameScheduler(MAX_STEPS_PER_SEC, MAX_FRAME_PER_SEC)
+cycleDetector = cycle_detection.CycleDetector()
+timings = instrumentation.Instrumentation(INSTRUMENT, dumpPath=TIMINGS_PATH)
 kernel = None
+kernelType = None
+kernelRadius = None
+kernelSpectrum = None
+kernelRuns = None
+kernelCache = kernel_cache.KernelCache(KERNEL_CACHE_BYTES)
+incrementalCounter = None
+parallelExecutor = None
 paused = True
 rRange = [1,ARR_W-1]
 surRange = [-1, -1]
 birthRange = [-1, -1]
 btnsList = None
 
+def randomUniverse(seed: int, aliveDenominator: float, width: int = ARR_W):
+  np.random.seed(seed)
+  arr = np.zeros((width*width), dtype=np.int8)
+  arr[np.random.choice(width*width, int(width*width/aliveDenominator), replace=False)] = 1
+  return np.reshape(arr,( width, width))
+
 def initArrVal():
   global universeArr
 
-  np.random.seed(seed)
-  universeArr = np.zeros((ARR_W_SQ), dtype=np.int8)
-  universeArr[np.random.choice(ARR_W_SQ, int(ARR_W_SQ/aliveAdjustDenominator), replace=False)] = 1
-  universeArr = np.reshape(universeArr,( ARR_W, ARR_W))
+  universeArr = randomUniverse(seed, aliveAdjustDenominator)
+  cycleDetector.reset()
+  cycleDetector.update(universeArr)
 
 def displayWindow():
   global canvas
+  global renderer
   global btnsList
 
   root = tk.Tk()
@@ -155,6 +198,9 @@ def displayWindow():
 
   canvas = tk.Canvas(frm, borderwidth=0, highlightthickness=0, height=CANVAS_W, width=CANVAS_W)
   canvas.grid(column=1, row=0, columnspan=3, rowspan=18, padx=(10,0))
+  renderer = tk_renderer.TkGridRenderer(canvas, (ARR_W, ARR_W), PIXEL_WIDTH, timings=timings)
+  if TIMINGS_OVERLAY:
+    instrumentation.CanvasOverlay(canvas, timings)
   canvasThread.start()
 
   playPauseBtn =  ttk.Button(frm, text="Play/Pause", command=setPlay)
@@ -177,17 +223,7 @@ def displayWindow():
   root.mainloop()
 
 def setCanvasThread():
-  global photoVar
-  global canvasImgVar
-
-  intermediateArr = np.repeat(np.logical_not(universeArr), PIXEL_WIDTH, axis=1).reshape(ARR_W, CANVAS_W)
-  largeArr = np.repeat(intermediateArr, PIXEL_WIDTH, axis=0).reshape(CANVAS_W, CANVAS_W)
-  newPhoto =  ImageTk.PhotoImage(image=Image.fromarray(largeArr*255))
-  if(canvasImgVar == None):
-    canvasImgVar = canvas.create_image(0,0, anchor="nw", image=newPhoto)
-  else:
-    canvas.itemconfig(canvasImgVar, image=newPhoto)
-  photoVar = newPhoto
+  renderer.submit(universeArr)
 
 def changeAliveDenominator(aliveVal: str):
   global aliveAdjustDenominator
@@ -199,8 +235,27 @@ def changeAliveDenominator(aliveVal: str):
   initArrVal()
   setCanvasThread()
 
+def buildKernel(kType: str, r: int, includeMiddle: bool):
+  if(kType == "Moore"):
+    kernel = np.ones((2*r+1, 2*r+1))
+  elif (kType == "circular"):
+    tempArr = (np.arange(-r,r+1))**2
+    kernel = ((tempArr[:,None] + tempArr)<=(r**2)).astype(int)
+  else:
+    a = np.arange(2*r+1)
+    b = np.minimum(a,a[::-1])
+    kernel = (b[:,None]+b >= (2*r-1)/2).astype(np.int8)
+  kernel[r, r] = 1 if includeMiddle else 0
+  return kernel
+
 def setkernel(kType: str, m: str, r: str, minb: str, maxb: str, mins: str, maxs: str, aliveVal: str):
   global kernel
+  global kernelType
+  global kernelRadius
+  global kernelSpectrum
+  global kernelRuns
+  global incrementalCounter
+  global parallelExecutor
   global surRange
   global birthRange
 
@@ -245,16 +300,23 @@ def setkernel(kType: str, m: str, r: str, minb: str, maxb: str, mins: str, maxs:
   for btn in btnsList[10:]:
     btn["state"] = "enabled"
 
-  if(kType == "Moore"):
-    kernel = np.ones((2*r+1, 2*r+1))
-  elif (kType == "circular"):
-    tempArr = (np.arange(-r,r+1))**2
-    kernel = ((tempArr[:,None] + tempArr)<=(r**2)).astype(int)
-  else:
-    a = np.arange(2*r+1)
-    b = np.minimum(a,a[::-1])
-    kernel = (b[:,None]+b >= (2*r-1)/2).astype(np.int8)
-  kernel[r, r] = 1 if m == "yes" else 0
+  includeMiddle = m == "Yes"
+  kernel = kernelCache.get(kernel_cache.kernelKey("kernel", kType, r, includeMiddle), lambda: buildKernel(kType, r, includeMiddle))
+  kernelType = kType
+  kernelRadius = r
+  if NEIGHBOUR_COUNT_METHOD == "fft":
+    key = kernel_cache.kernelKey("spectrum", kType, r, includeMiddle, (ARR_W, ARR_W), np.float64)
+    kernelSpectrum = kernelCache.get(key, lambda: fft_convolution.kernelSpectrum(kernel, (ARR_W, ARR_W)))
+  if NEIGHBOUR_COUNT_METHOD == "jit":
+    kernelRuns = stencil_jit.compileRuns(kernel)
+  if NEIGHBOUR_COUNT_METHOD == "incremental":
+    incrementalCounter = incremental_counts.IncrementalCounter(kernel, INCREMENTAL_MAX_FLIP_FRACTION)
+  if PARALLEL_WORKERS > 0:
+    if parallelExecutor != None:
+      parallelExecutor.close()
+    parallelExecutor = parallel_stepping.SharedMemoryExecutor((ARR_W, ARR_W), np.int8, stepArray, (kernel, surRange, birthRange), halo=r, workers=PARALLEL_WORKERS)
+  cycleDetector.reset()
+  cycleDetector.update(universeArr)
   print(kernel)
 
   return None
@@ -280,11 +342,11 @@ def nextFrame():
   paused = True
   if(playThread != None):
     playThread.join()
-  startTime = time.time()
-  universeArr = getNextTimestep()
-  canvasThread = threading.Thread(target=setCanvasThread)
-  canvasThread.start()
-  print("Time to generate last frame:", time.time() - startTime)
+  with timings.phase("nextFrame"):
+    universeArr = getNextTimestep()
+    checkCycle(universeArr)
+    canvasThread = threading.Thread(target=setCanvasThread)
+    canvasThread.start()
 
 def setPlay():
   global paused
@@ -317,25 +379,63 @@ def playLoop():
   global universeArr
   global canvasThread
 
+  scheduler.reset()
   while not paused:
-    startTime = time.time()
+    scheduler.waitForStep()
     newArr = getNextTimestep()
-    canvasThread.join()
-    universeArr = newArr
-    canvasThread = threading.Thread(target=setCanvasThread)
-    canvasThread.start()
-    endTime = time.time()
-    while (endTime-startTime) < 1/MAX_FRAME_PER_SEC:
-      endTime = time.time()
-    print("Time to generate last frame:", time.time() - startTime)
+    with timings.phase("cycleCheck"):
+      checkCycle(newArr)
+    scheduler.stepDone()
+    if scheduler.shouldRender(canvasThread.is_alive()):
+      with timings.phase("canvasJoin"):
+        canvasThread.join()
+      universeArr = newArr
+      canvasThread = threading.Thread(target=setCanvasThread)
+      canvasThread.start()
+    else:
+      universeArr = newArr
+    timings.dumpIfDue()
+    if scheduler.reportDue():
+      print(scheduler.report())
+
+def checkCycle(arr):
+  global paused
+
+  if cycleDetector.update(arr):
+    print(cycleDetector.describe())
+    if AUTO_PAUSE_ON_CYCLE:
+      paused = True
+
+def countNeighbours():
+  if NEIGHBOUR_COUNT_METHOD == "fft":
+    return np.rint(fft_convolution.correlateWrap(universeArr, kernelSpectrum)).astype(np.int32)
+  if NEIGHBOUR_COUNT_METHOD == "incremental":
+    return incrementalCounter.count(universeArr)
+  if NEIGHBOUR_COUNT_METHOD == "jit":
+    return stencil_jit.countNeighbours(universeArr, kernelRuns)
+  if NEIGHBOUR_COUNT_METHOD == "sat":
+    return summed_area.neighbourCounts(universeArr, kernelType, kernelRadius, kernel[kernelRadius, kernelRadius] != 0)
+  return scipy.ndimage.correlate(universeArr, kernel, output=np.int32, mode="wrap")
+
+def applyRule(cellsArr, neighboursArr, surRange, birthRange):
+  nextTimestep = np.where(cellsArr, np.logical_and(neighboursArr>=surRange[0], neighboursArr<=surRange[1]), np.logical_and(neighboursArr>=birthRange[0], neighboursArr<=birthRange[1]))
+  return nextTimestep.astype(np.int8)
+
+def stepArray(arr, kernel, surRange, birthRange):
+  neighboursArr = scipy.ndimage.correlate(arr, kernel, output=np.int32, mode="wrap")
+  return applyRule(arr, neighboursArr, surRange, birthRange)
 
 def getNextTimestep():
   #print(universeArr[:11,:11])
   #print(universeArr[:11,:11].sum())
-  neighboursArr = scipy.ndimage.correlate(universeArr, kernel, mode="wrap")
-  nextTimestep = np.where(universeArr, np.logical_and(neighboursArr>=surRange[0], neighboursArr<=surRange[1]), np.logical_and(neighboursArr>=birthRange[0], neighboursArr<=birthRange[1]))
+  if parallelExecutor != None:
+    with timings.phase("parallelStep"):
+      return parallelExecutor.run(universeArr)
+  with timings.phase("neighbourCount"):
+    neighboursArr = countNeighbours()
   #print(nextTimestep.astype(np.int8)[:11,:11])
-  return nextTimestep.astype(np.int8)
+  with timings.phase("rule"):
+    return applyRule(universeArr, neighboursArr, surRange, birthRange)
 
 if __name__ == "__main__":
   initArrVal()
@@ -0,0 +1,91 @@
+import numpy as np
+import scipy.fft
+import fft_convolution
+import Lenia
+
+'''
+Lenia with several channels and several kernels.
+
+The universe is a (C, ARR_W, ARR_W) array, one layer per channel. Every kernel is a dict:
+  - source, destination: the channel the kernel reads and the channel its growth is added to.
+  - radius: the radius of the kernel in cells.
+  - peaks: the heights of the concentric rings, from the middle out. [1] is one ring like `Lenia.py`, [1, 0.5] a ring with a weaker one around it.
+  - ringWidth: the width of the bell that makes every ring, relative to the ring spacing.
+  - mean, sd: the growth function of the kernel (see `Lenia.growth`).
+  - weight: how much the growth counts in its destination channel. The weights of the kernels with the same destination are normalised to sum to 1, and a channel that no kernel writes to doesn't change.
+
+A step computes every potential in one batched pass through FFTs (see `fft_convolution.py`):
+  - one rfft2 per channel, shared by every kernel that reads the channel.
+  - the K channel spectra are multiplied by the K kernel spectra (computed once) and transformed back with one batched irfft2.
+  - the K growths are evaluated in place and summed into their destination channels with one matrix product.
+So a kernel costs one multiplication, one inverse transform and one growth evaluation, never another forward transform of its channel.
+
+  lenia = MultiChannelLenia(3, EXAMPLE_KERNELS, (ARR_W, ARR_W))
+  universeArr = lenia.step(universeArr)
+'''
+
+ARR_W = 128
+DEFAULT_TIME_FRAC = 10
+EXAMPLE_KERNELS = [
+  {"source": 0, "destination": 0, "radius": 13, "peaks": [1], "ringWidth": 0.15, "mean": 0.15, "sd": 0.015, "weight": 1},
+  {"source": 0, "destination": 1, "radius": 13, "peaks": [1, 0.5], "ringWidth": 0.15, "mean": 0.2, "sd": 0.03, "weight": 1},
+  {"source": 1, "destination": 1, "radius": 8, "peaks": [1], "ringWidth": 0.15, "mean": 0.12, "sd": 0.02, "weight": 2},
+  {"source": 1, "destination": 2, "radius": 10, "peaks": [0.5, 1], "ringWidth": 0.15, "mean": 0.14, "sd": 0.02, "weight": 1},
+  {"source": 2, "destination": 0, "radius": 10, "peaks": [1], "ringWidth": 0.15, "mean": 0.13, "sd": 0.025, "weight": 1},
+]
+
+def ringKernel(radius: int, peaks, ringWidth: float):
+  tempArr = np.arange(-radius, radius+1)
+  distance = np.sqrt(tempArr[:,None]**2 + tempArr**2) / radius * len(peaks)
+  ring = np.minimum(distance.astype(int), len(peaks)-1)
+  kernel = np.asarray(peaks, dtype=np.float64)[ring] * np.exp(-0.5 * (((distance % 1) - 0.5) / ringWidth)**2)
+  kernel[distance >= len(peaks)] = 0
+  return kernel / np.sum(kernel)
+
+def randomUniverse(channels: int, shape, seed: int = 0):
+  np.random.seed(seed)
+  return np.random.random((channels,) + tuple(shape))
+
+class MultiChannelLenia:
+  def __init__(self, channels: int, kernels, shape, timeFrac: float = DEFAULT_TIME_FRAC, dtype=np.float64):
+    for k in kernels:
+      if not (0 <= k["source"] < channels and 0 <= k["destination"] < channels):
+        raise ValueError(f"Kernel channels need to be in 0 - {channels-1}")
+    self.channels = channels
+    self.shape = tuple(shape)
+    self.timeFrac = timeFrac
+    self.dtype = dtype
+    self.sources = np.array([k["source"] for k in kernels])
+    self.spectra = np.stack([fft_convolution.kernelSpectrum(ringKernel(k["radius"], k["peaks"], k["ringWidth"]), self.shape, dtype) for k in kernels])
+    self.means = np.array([k["mean"] for k in kernels], dtype=dtype)[:, None, None]
+    self.sds = np.array([k["sd"] for k in kernels], dtype=dtype)[:, None, None]
+    # (C, K) matrix that sums the growth of every kernel into its destination channel
+    self.weights = np.zeros((channels, len(kernels)), dtype=dtype)
+    for i, k in enumerate(kernels):
+      self.weights[k["destination"], i] = k["weight"]
+    totals = self.weights.sum(axis=1, keepdims=True)
+    np.divide(self.weights, totals, out=self.weights, where=totals != 0)
+    self.weights /= timeFrac
+
+  def potentials(self, arr):
+    channelSpectra = scipy.fft.rfft2(arr, workers=fft_convolution.FFT_WORKERS)
+    products = channelSpectra[self.sources]
+    products *= self.spectra
+    return scipy.fft.irfft2(products, s=self.shape, workers=fft_convolution.FFT_WORKERS, overwrite_x=True)
+
+  def step(self, arr, out=None):
+    growths = self.potentials(arr)
+    Lenia.growth(growths, self.means, self.sds, out=growths)
+    if out is None:
+      out = np.empty_like(arr)
+    np.matmul(self.weights, growths.reshape(len(growths), -1), out=out.reshape(self.channels, -1))
+    out += arr
+    return np.clip(out, 0, 1, out=out)
+
+if __name__ == "__main__":
+  lenia = MultiChannelLenia(3, EXAMPLE_KERNELS, (ARR_W, ARR_W))
+  universeArr = randomUniverse(3, (ARR_W, ARR_W))
+  for generation in range(1, 201):
+    universeArr = lenia.step(universeArr)
+    if generation % 20 == 0:
+      print(generation, universeArr.sum(axis=(1, 2)).round(1))
@@ -0,0 +1,57 @@
+import re
+import numpy as np
+import scipy.ndimage
+
+'''
+Life-like (outer totalistic) rules from B/S rulestrings.
+
+A rulestring lists the neighbour counts a dead cell is born with and the counts a live cell survives with:
+  - "B3/S23": Conway's Game of Life.
+  - "B3/S12345": Maze.
+  - "B3/S1234": Mazectric.
+The letters can be lower case and the slash can be left out ("b3s23"), and the old S/B notation ("23/3") is read too.
+
+`compileRule` turns a rule into a (2, 9) lookup table indexed by (state, neighbour count). The cell itself is given the weight 9 in the counting kernel, so one uint8 convolution gives state*9 + neighbours, which is the flat index into the table, and the next generation is a single gather.
+
+  table = compileRule("B36/S23")
+  universeArr = stepArray(universeArr, table)
+'''
+
+CONWAY_RULE = "B3/S23"
+STATE_KERNEL = np.array([[1,1,1],[1,9,1],[1,1,1]], dtype=np.uint8)
+
+def parseRule(rule: str):
+  text = rule.replace(" ", "").upper()
+  match = re.fullmatch(r"B([0-8]*)/?S([0-8]*)", text)
+  if match:
+    births, survivals = match.groups()
+  else:
+    match = re.fullmatch(r"([0-8]*)/([0-8]*)", text)
+    if not match:
+      raise ValueError(f"{rule} is not a B/S rulestring")
+    survivals, births = match.groups()
+  return sorted({int(c) for c in births}), sorted({int(c) for c in survivals})
+
+def compileRule(rule: str):
+  births, survivals = parseRule(rule)
+  table = np.zeros((2, 9), dtype=np.int8)
+  table[0, births] = 1
+  table[1, survivals] = 1
+  return table
+
+def isConway(table):
+  # the bitpacked engine and Hashlife only run B3/S23
+  return np.array_equal(table, compileRule(CONWAY_RULE))
+
+def ruleString(table):
+  births = "".join(str(n) for n in np.nonzero(table[0])[0])
+  survivals = "".join(str(n) for n in np.nonzero(table[1])[0])
+  return f"B{births}/S{survivals}"
+
+def applyRule(table, cellsArr, neighboursArr):
+  # same signature as the `applyRule` functions of the scripts, with the table first
+  return np.take(table.ravel(), neighboursArr + 9*cellsArr.astype(np.uint8), mode="clip")
+
+def stepArray(arr, table):
+  index = scipy.ndimage.convolve(arr, STATE_KERNEL, output=np.uint8, mode="wrap")
+  return np.take(table.ravel(), index, mode="clip")
@@ -0,0 +1,160 @@
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+import numpy as np
+import scipy.ndimage
+import fft_convolution
+import summed_area
+import stencil_jit
+import incremental_counts
+import larger_than_life
+import cycle_detection
+import kernel_cache
+
+'''
+Headless batch runner for Larger Than Life rule sweeps.
+
+Every combination of the given kernel types, radii, include-middle values, survival ranges, birth ranges, seeds and alive denominators is run for [generations] generations on a pool of processes, and a summary is returned for each run:
+  - population, density: at the last generation.
+  - minPopulation, maxPopulation, meanPopulation: over every generation (including the first one).
+  - lastChanged: number of cells that changed in the last generation.
+  - died: the population reached 0 (the run is stopped there).
+  - period, cycleStart: the still life or oscillator the run settled into (see `cycle_detection.py`), None if none was found. With stopOnCycle (--stop-on-cycle) the run is stopped as soon as one is found, since every later generation is a repeat; the population statistics then cover the run up to there, which includes one whole cycle.
+
+Ranges use the same format as the "Interesting settings" in `larger_than_life.py`, for example the "Bugs" rule:
+  python ltl_batch.py --kernel Moore --radius 5 --include-middle yes --survival 34..58 --birth 34..45 --seed 0 1 2 3 --alive-denominator 4 --generations 500
+Every process keeps the kernels and spectra it built in an LRU cache (see `kernel_cache.py`), so the runs that share a kernel (every seed, alive denominator, survival and birth range of it) build it once.
+Results are written as JSON lines (or CSV with --csv) to stdout or to --output.
+'''
+
+kernelCache = kernel_cache.KernelCache()
+
+def parseRange(text: str):
+  low, _, high = text.partition("..")
+  return [int(low), int(high or low)]
+
+def expandGrid(kernelTypes, radii, includeMiddles, survivalRanges, birthRanges, seeds, aliveDenominators, width: int = larger_than_life.ARR_W, method: str = "correlate", stopOnCycle: bool = False, maxPeriod: int = cycle_detection.DEFAULT_MAX_PERIOD):
+  configs = []
+  for kType, r, m, sur, birth, seed, alive in itertools.product(kernelTypes, radii, includeMiddles, survivalRanges, birthRanges, seeds, aliveDenominators):
+    configs.append({"kernelType": kType, "radius": r, "includeMiddle": m, "survival": list(sur), "birth": list(birth), "seed": seed, "aliveDenominator": alive, "width": width, "method": method, "stopOnCycle": stopOnCycle, "maxPeriod": maxPeriod})
+  return configs
+
+def makeCounter(config, kernel, shape):
+  method = config["method"]
+  if method == "fft":
+    key = kernel_cache.kernelKey("spectrum", config["kernelType"], config["radius"], config["includeMiddle"], shape, np.float64)
+    spectrum = kernelCache.get(key, lambda: fft_convolution.kernelSpectrum(kernel, shape))
+    return lambda arr: np.rint(fft_convolution.correlateWrap(arr, spectrum)).astype(np.int32)
+  if method == "incremental":
+    return incremental_counts.IncrementalCounter(kernel).count
+  if method == "jit":
+    runs = stencil_jit.compileRuns(kernel)
+    return lambda arr: stencil_jit.countNeighbours(arr, runs)
+  if method == "sat" and config["kernelType"] in summed_area.SAT_KERNEL_TYPES:
+    return lambda arr: summed_area.neighbourCounts(arr, config["kernelType"], config["radius"], config["includeMiddle"])
+  return lambda arr: scipy.ndimage.correlate(arr, kernel, output=np.int32, mode="wrap")
+
+def runConfiguration(config, generations: int):
+  result = dict(config)
+  sur = config["survival"]
+  birth = config["birth"]
+  if sur[0] > sur[1] or birth[0] > birth[1]:
+    result["error"] = "Minimum value is larger than maximum"
+    return result
+  if config["radius"] < 1 or config["aliveDenominator"] < 1:
+    result["error"] = "Radius and alive denominator need to be at least 1"
+    return result
+
+  startTime = time.time()
+  key = kernel_cache.kernelKey("kernel", config["kernelType"], config["radius"], config["includeMiddle"])
+  kernel = kernelCache.get(key, lambda: larger_than_life.buildKernel(config["kernelType"], config["radius"], config["includeMiddle"]))
+  universe = larger_than_life.randomUniverse(config["seed"], config["aliveDenominator"], config["width"])
+  countNeighbours = makeCounter(config, kernel, universe.shape)
+  cycleDetector = cycle_detection.CycleDetector(config.get("maxPeriod", cycle_detection.DEFAULT_MAX_PERIOD))
+  cycleDetector.update(universe)
+  stopOnCycle = config.get("stopOnCycle", False)
+
+  population = int(universe.sum())
+  minPopulation = maxPopulation = totalPopulation = population
+  lastChanged = 0
+  generation = 0
+  while generation < generations and population > 0:
+    nextUniverse = larger_than_life.applyRule(universe, countNeighbours(universe), sur, birth)
+    lastChanged = int(np.count_nonzero(nextUniverse != universe))
+    universe = nextUniverse
+    generation += 1
+    population = int(universe.sum())
+    minPopulation = min(minPopulation, population)
+    maxPopulation = max(maxPopulation, population)
+    totalPopulation += population
+    if cycleDetector.update(universe) and stopOnCycle:
+      break
+
+  result.update({
+    "generations": generation,
+    "population": population,
+    "density": population / universe.size,
+    "minPopulation": minPopulation,
+    "maxPopulation": maxPopulation,
+    "meanPopulation": totalPopulation / (generation+1),
+    "lastChanged": lastChanged,
+    "died": population == 0,
+    "period": cycleDetector.period,
+    "cycleStart": cycleDetector.cycleStart,
+    "seconds": time.time() - startTime,
+  })
+  return result
+
+def runConfigurationStar(args):
+  return runConfiguration(*args)
+
+def runSweep(configs, generations: int, processes: int = None):
+  # results come back in the same order as [configs]
+  with multiprocessing.Pool(processes) as pool:
+    return list(pool.imap(runConfigurationStar, [(config, generations) for config in configs], chunksize=1))
+
+def writeResults(results, stream, asCsv: bool = False):
+  if asCsv:
+    fields = []
+    for result in results:
+      fields += [key for key in result if key not in fields]
+    writer = csv.DictWriter(stream, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(results)
+  else:
+    for result in results:
+      stream.write(json.dumps(result) + "\n")
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Run Larger Than Life rule sweeps without a display.")
+  parser.add_argument("--kernel", nargs="+", default=["Moore"], choices=["Moore", "von Neumann", "circular"])
+  parser.add_argument("--radius", nargs="+", type=int, default=[1])
+  parser.add_argument("--include-middle", nargs="+", default=["no"], choices=["yes", "no"])
+  parser.add_argument("--survival", nargs="+", type=parseRange, default=[[2, 3]], help="ranges like 2..3")
+  parser.add_argument("--birth", nargs="+", type=parseRange, default=[[3, 3]], help="ranges like 3..3")
+  parser.add_argument("--seed", nargs="+", type=int, default=[0])
+  parser.add_argument("--alive-denominator", nargs="+", type=float, default=[2])
+  parser.add_argument("--width", type=int, default=larger_than_life.ARR_W)
+  parser.add_argument("--generations", type=int, default=100)
+  parser.add_argument("--method", default="correlate", choices=["correlate", "fft", "sat", "jit", "incremental"])
+  parser.add_argument("--stop-on-cycle", action="store_true", help="stop a run once it settles into a still life or an oscillator")
+  parser.add_argument("--max-period", type=int, default=cycle_detection.DEFAULT_MAX_PERIOD, help="longest cycle looked for")
+  parser.add_argument("--processes", type=int, default=None, help="defaults to every core")
+  parser.add_argument("--output", default=None)
+  parser.add_argument("--csv", action="store_true")
+  args = parser.parse_args(argv)
+
+  configs = expandGrid(args.kernel, args.radius, [m == "yes" for m in args.include_middle], args.survival, args.birth, args.seed, args.alive_denominator, args.width, args.method, args.stop_on_cycle, args.max_period)
+  results = runSweep(configs, args.generations, args.processes)
+  if args.output is None:
+    writeResults(results, sys.stdout, args.csv)
+  else:
+    with open(args.output, "w", newline="") as f:
+      writeResults(results, f, args.csv)
+
+if __name__ == "__main__":
+  main()
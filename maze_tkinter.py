@@ -1,11 +1,15 @@
-import time
 from tkinter import Canvas, ttk
 import numpy as np
 import tkinter as tk
 import threading
 import os
-from PIL import ImageTk, Image
-import scipy.ndimage
+import tk_renderer
+import frame_scheduler
+import dirty_tiles
+import cycle_detection
+import life_rules
+import instrumentation
+import pattern_io
 
 '''
 Rules:
@@ -13,6 +17,11 @@ Although the universe is suppose to be infinite, I will be using an [ARR_W] x [A
   - Any live cell with 1 to 5 live neighbours lives on to the next generation, otherwise it dies.
   - Any dead cell with exactly three live neighbours becomes a live cell.
 if [MAZECTRIC] is True, then cells don't survive if they have 5 neighbours.
+As B/S rulestrings (see `life_rules.py`) these are "B3/S12345" (Maze) and "B3/S1234" (Mazectric), and [RULE] can be set to any other one.
+If [PATTERN_PATH] is set (an RLE or Macrocell file, see `pattern_io.py`), the universe starts empty with that pattern in the middle instead of random.
+If [USE_DIRTY_TILES] is True, only the tiles that changed in the last generation (and their neighbours) are recomputed (see `dirty_tiles.py`). Mazes freeze quickly, so most of the board is skipped after a while.
+Every generation is checked for still lifes and oscillators (see `cycle_detection.py`). If [AUTO_PAUSE_ON_CYCLE] is True, the play loop pauses when the maze has stopped changing.
+If [INSTRUMENT] is True, the phases of every step (step, cycle check, waiting for the canvas thread, submit, paste) are timed (see `instrumentation.py`). [TIMINGS_OVERLAY] draws their percentiles on the canvas and [TIMINGS_PATH] dumps them to a CSV or JSON file every few seconds.
 '''
 
 MAZECTRIC = False
@@ -21,25 +30,46 @@ ARR_W_SQ = ARR_W**2
 PIXEL_WIDTH = 4
 CANVAS_W = ARR_W*PIXEL_WIDTH
 MAX_FRAME_PER_SEC = 6
-MAX_NEIGHBOURS = 4 if MAZECTRIC else 5
+MAX_STEPS_PER_SEC = MAX_FRAME_PER_SEC
+RULE = "B3/S1234" if MAZECTRIC else "B3/S12345"
+USE_DIRTY_TILES = False
+PATTERN_PATH = None
+AUTO_PAUSE_ON_CYCLE = True
+INSTRUMENT = False
+TIMINGS_OVERLAY = False
+TIMINGS_PATH = None
 universeArr = None
+tileStepper = None
 canvas: Canvas = None
 threadEvent = threading.Event()
 playThread = None
 canvasThread = None
-photoVar = None
-canvasImgVar = None
+renderer = None
+scheduler = frame_scheduler.FrameScheduler(MAX_STEPS_PER_SEC, MAX_FRAME_PER_SEC)
+ruleTable = life_rules.compileRule(RULE)
+cycleDetector = cycle_detection.CycleDetector()
+timings = instrumentation.Instrumentation(INSTRUMENT, dumpPath=TIMINGS_PATH)
 
 def initArrVal():
   global universeArr
   global universeArr2
+  global tileStepper
 
-  universeArr = np.zeros((ARR_W_SQ), dtype=np.int8)
-  universeArr[np.random.choice(ARR_W_SQ, ARR_W_SQ//10, replace=False)] = 1
-  universeArr = np.reshape(universeArr,( ARR_W, ARR_W))
+  if PATTERN_PATH != None:
+    universeArr = np.zeros((ARR_W, ARR_W), dtype=np.int8)
+    pattern_io.loadPattern(PATTERN_PATH, universeArr)
+  else:
+    universeArr = np.zeros((ARR_W_SQ), dtype=np.int8)
+    universeArr[np.random.choice(ARR_W_SQ, ARR_W_SQ//10, replace=False)] = 1
+    universeArr = np.reshape(universeArr,( ARR_W, ARR_W))
+  if USE_DIRTY_TILES:
+    tileStepper = dirty_tiles.DirtyTileStepper(universeArr, applyRule)
+  cycleDetector.reset()
+  cycleDetector.update(universeArr)
 
 def displayWindow():
   global canvas
+  global renderer
   root = tk.Tk()
   root.title("Conway's Game of Life")
   s = ttk.Style()
@@ -48,6 +78,9 @@ def displayWindow():
   frm.grid(padx=10, pady=10)
   canvas = tk.Canvas(frm, borderwidth=0, highlightthickness=0, height=CANVAS_W, width=CANVAS_W)
   canvas.grid(column=0, row=0,padx=1, columnspan=2)
+  renderer = tk_renderer.TkGridRenderer(canvas, (ARR_W, ARR_W), PIXEL_WIDTH, timings=timings)
+  if TIMINGS_OVERLAY:
+    instrumentation.CanvasOverlay(canvas, timings)
   canvasThread.start()
   ttk.Button(frm, text="Play/Pause", command=setPlay).grid(column=0, row=1, pady=10)
   ttk.Button(frm, text="Next Frame", command=nextFrame).grid(column=1, row=1, pady=10)
@@ -56,16 +89,7 @@ def displayWindow():
   root.mainloop()
 
 def setCanvasThread():
-  global photoVar
-  global canvasImgVar
-
-  intermediateArr = np.repeat(np.logical_not(universeArr)*255, PIXEL_WIDTH, axis=1).reshape(ARR_W, CANVAS_W)
-  largeArr = np.repeat(intermediateArr, PIXEL_WIDTH, axis=0).reshape(CANVAS_W, CANVAS_W)
-  photoVar =  ImageTk.PhotoImage(image=Image.fromarray(largeArr))
-  if(canvasImgVar == None):
-    canvasImgVar = canvas.create_image(0,0, anchor="nw", image=photoVar)
-  else:
-    canvas.itemconfig(canvasImgVar, image=photoVar)
+  renderer.submit(universeArr)
 
 def nextFrame():
   threadEvent.clear()
@@ -80,25 +104,46 @@ def setPlay():
 def playLoop(e: threading.Event):
   while True:
     e.wait()
-    startTime = time.time()
-    t = threading.Thread(target=setNextTimestep)
-    t.start()
-    t.join()
-    endTime = time.time()
-    while ((endTime-startTime) < 1/MAX_FRAME_PER_SEC):
-      endTime = time.time()
-    #print("Time to generate last frame:", endTime - startTime)
+    scheduler.waitForStep()
+    setNextTimestep(scheduler.shouldRender(canvasThread.is_alive()))
+    scheduler.stepDone()
+    timings.dumpIfDue()
+    if scheduler.reportDue():
+      print(scheduler.report())
+
+def checkCycle(arr):
+  if cycleDetector.update(arr):
+    print(cycleDetector.describe())
+    if AUTO_PAUSE_ON_CYCLE:
+      threadEvent.clear()
+
+def applyRule(cellsArr, neighboursArr):
+  return life_rules.applyRule(ruleTable, cellsArr, neighboursArr)
+
+def stepArray(arr):
+  return life_rules.stepArray(arr, ruleTable)
 
-def setNextTimestep():
+def setNextTimestep(render: bool = True):
   global universeArr
   global canvasThread
 
-  kernel = np.ones((3,3))
-  kernel[1,1] = 0
-  neighboursArr = scipy.ndimage.convolve(universeArr, kernel, mode="wrap")
-  nextTimestep = np.where(universeArr,np.logical_and(neighboursArr>=1 ,neighboursArr<=MAX_NEIGHBOURS),neighboursArr==3)
-  canvasThread.join()
-  universeArr = nextTimestep.astype(np.int8)
+  if USE_DIRTY_TILES and canvasThread != None and canvasThread.is_alive():
+    # the stepper writes into its buffer of two generations ago, which the canvas thread may still be drawing
+    with timings.phase("canvasJoin"):
+      canvasThread.join()
+  with timings.phase("step"):
+    if USE_DIRTY_TILES:
+      nextTimestep = tileStepper.step()
+    else:
+      nextTimestep = stepArray(universeArr)
+  with timings.phase("cycleCheck"):
+    checkCycle(nextTimestep)
+  if not render:
+    universeArr = nextTimestep
+    return
+  with timings.phase("canvasJoin"):
+    canvasThread.join()
+  universeArr = nextTimestep
   canvasThread = threading.Thread(target=setCanvasThread)
   canvasThread.start()
 
@@ -0,0 +1,138 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import threading
+import traceback
+import numpy as np
+
+'''
+Steps a looped universe on several processes.
+
+The universe lives in two blocks of shared memory (the current generation and the next one). It is split into horizontal strips, one per worker process. For every generation a worker copies its strip plus [halo] rows above and below it (wrapping around) out of the current block, which is how the halos are exchanged, runs the step function on that, and writes the middle rows back into the next block. The workers then wait for each other on a barrier and swap the blocks.
+
+Every step function of the scripts loops around the edges on its own (mode="wrap"), so the strip is only wrong in the rows that are within a kernel radius of its top and bottom. Those are the halo rows, which are thrown away, so [halo] has to be at least the radius of the kernel.
+
+[stepFunction] is called as stepFunction(arr, *stepArgs) and has to be importable by the worker processes, like the `stepArray` functions of the scripts:
+  executor = SharedMemoryExecutor(universeArr.shape, universeArr.dtype, larger_than_life.stepArray, (kernel, surRange, birthRange), halo=r)
+  universeArr = executor.run(universeArr, generations=10)
+  executor.close()
+If a step function raises, its worker aborts the barrier (so the other workers stop waiting for it) and sends the traceback back, and `step` raises it as a RuntimeError in the parent. `step` also raises if a worker process died. The executor can't be used after that, only closed.
+'''
+
+PARENT_POLL_SECONDS = 1
+BROKEN_BARRIER = "broken barrier"
+
+def stepStrip(names, shape, dtype, start: int, stop: int, halo: int, stepFunction, stepArgs, barrier, commands, done):
+  blocks = [shared_memory.SharedMemory(name=name) for name in names]
+  arrs = [np.ndarray(shape, dtype=dtype, buffer=block.buf) for block in blocks]
+  rows = np.arange(start-halo, stop+halo) % shape[0]
+  parent = multiprocessing.parent_process()
+
+  while True:
+    try:
+      command = commands.get(timeout=PARENT_POLL_SECONDS)
+    except queue.Empty:
+      if parent is not None and not parent.is_alive():
+        break
+      continue
+    if command is None:
+      break
+    generations, current = command
+    error = None
+    try:
+      for _ in range(generations):
+        nextStrip = stepFunction(arrs[current][rows], *stepArgs)
+        arrs[1-current][start:stop] = nextStrip[halo:halo+stop-start]
+        barrier.wait()
+        current = 1-current
+    except threading.BrokenBarrierError:
+      # another worker failed
+      error = BROKEN_BARRIER
+    except Exception:
+      barrier.abort()
+      error = traceback.format_exc()
+    done.put((start, error))
+
+  del arrs
+  for block in blocks:
+    block.close()
+
+class SharedMemoryExecutor:
+  def __init__(self, shape, dtype, stepFunction, stepArgs=(), halo: int = 1, workers: int = None):
+    self.shape = tuple(shape)
+    self.dtype = np.dtype(dtype)
+    workers = min(workers or multiprocessing.cpu_count(), self.shape[0])
+    ctx = multiprocessing.get_context("spawn")
+
+    nbytes = int(np.prod(self.shape)) * self.dtype.itemsize
+    self.blocks = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(2)]
+    self.arrs = [np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf) for block in self.blocks]
+    self.current = 0
+    self.error = None
+
+    bounds = np.linspace(0, self.shape[0], workers+1).astype(int)
+    self.barrier = ctx.Barrier(workers)
+    self.done = ctx.Queue()
+    self.commands = []
+    self.processes = []
+    names = [block.name for block in self.blocks]
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+      commands = ctx.Queue()
+      p = ctx.Process(target=stepStrip, args=(names, self.shape, self.dtype, start, stop, halo, stepFunction, stepArgs, self.barrier, commands, self.done), daemon=True)
+      p.start()
+      self.commands.append(commands)
+      self.processes.append(p)
+
+  def load(self, arr):
+    self.arrs[self.current][...] = arr
+
+  def step(self, generations: int = 1):
+    if self.error != None:
+      raise RuntimeError(f"The executor failed earlier:\n{self.error}")
+    for commands in self.commands:
+      commands.put((generations, self.current))
+    errors = []
+    pending = len(self.processes)
+    while pending:
+      try:
+        _, error = self.done.get(timeout=PARENT_POLL_SECONDS)
+      except queue.Empty:
+        dead = [p for p in self.processes if not p.is_alive()]
+        if dead:
+          # the workers that are still alive are waiting for it on the barrier
+          self.barrier.abort()
+          self.error = f"Worker process {dead[0].pid} exited with code {dead[0].exitcode}"
+          raise RuntimeError(self.error)
+        continue
+      pending -= 1
+      if error != None:
+        errors.append(error)
+    if errors:
+      tracebacks = [error for error in errors if error != BROKEN_BARRIER]
+      self.error = tracebacks[0] if tracebacks else BROKEN_BARRIER
+      raise RuntimeError(f"A worker failed to step its strip:\n{self.error}")
+    self.current = (self.current + generations) % 2
+
+  def read(self):
+    return self.arrs[self.current].copy()
+
+  def run(self, arr, generations: int = 1):
+    self.load(arr)
+    self.step(generations)
+    return self.read()
+
+  def close(self):
+    for commands in self.commands:
+      commands.put(None)
+    for p in self.processes:
+      p.join()
+    self.arrs = None
+    for block in self.blocks:
+      block.close()
+      block.unlink()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
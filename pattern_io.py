@@ -0,0 +1,383 @@
+import os
+import re
+import numpy as np
+import bitpacked_life
+import hashlife
+
+'''
+Reading and writing patterns as RLE (.rle) and Macrocell (.mc) files, the formats of Golly and the LifeWiki pattern collections.
+
+RLE files are read in chunks of [RLE_CHUNK_BYTES], so a file is never held in memory whole. Every chunk is decoded with NumPy: the run counts are built from the digit bytes in one pass, the row and column of every run come from cumulative sums (reset at every "$"), and the live runs are expanded and written into the grid with one fancy assignment (or one bitwise_or.at for a bit-packed grid, see `bitpacked_life.py`). There is no Python loop over the cells or the runs, only over the chunks.
+
+Macrocell files hold the quadtree of `hashlife.py`: one line per node, children before their parents, with 8 x 8 leaves written as rows of "." and "*". They are read line by line into a `hashlife.HashlifeStore`, so a pattern that would be far too big as an array (or that repeats a lot) can still be loaded and jumped, and equal leaves are parsed once. When they are written into a grid, every leaf is copied as one 8 x 8 block.
+
+A pattern is placed with its top left corner at ([top], [left]) of an existing grid, or centred in it when they are None. Live cells are set and the other cells are left as they are, and cells that fall outside the grid are dropped.
+
+  universeArr = np.zeros((ARR_W, ARR_W), dtype=np.int8)
+  loadPattern("gosper_glider_gun.rle", universeArr)
+  saveRle("universe.rle", universeArr, RULE)
+Only two state patterns are supported.
+'''
+
+RLE_CHUNK_BYTES = 1 << 20
+RLE_BLOCK_ROWS = 1024
+RLE_LINE_WIDTH = 70
+RLE_HEADER = re.compile(rb"\s*x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)(?:\s*,\s*rule\s*=\s*([^\s,]+))?", re.IGNORECASE)
+MC_MAGIC = b"[M2]"
+MC_LEAF_LEVEL = 3
+MC_LEAF_SIZE = 1 << MC_LEAF_LEVEL
+
+def readRleHeader(f):
+  # reads the comments and the "x = , y = " line, returns the header and any body bytes read with it
+  header = {"width": None, "height": None, "rule": None, "comments": []}
+  for line in f:
+    stripped = line.strip()
+    if not stripped:
+      continue
+    if stripped.startswith(b"#"):
+      header["comments"].append(stripped.decode(errors="replace"))
+      continue
+    match = RLE_HEADER.match(stripped)
+    if match == None:
+      return header, stripped
+    header["width"], header["height"] = int(match.group(1)), int(match.group(2))
+    if match.group(3) != None:
+      header["rule"] = match.group(3).decode()
+    return header, b""
+  return header, b""
+
+def decodeRleChunk(buf, row: int, x: int):
+  # [buf] holds whole tokens without whitespace, returns the live runs (rows, starts, lengths) and the row and column after the chunk
+  isDigit = (buf >= ord("0")) & (buf <= ord("9"))
+  tagPos = np.flatnonzero(~isDigit)
+  n = len(tagPos)
+  if n == 0:
+    empty = np.zeros(0, dtype=np.int64)
+    return empty, empty, empty, row, x
+
+  digitPos = np.flatnonzero(isDigit)
+  # every digit belongs to the tag after it, and is worth 10^(its distance to the tag - 1)
+  owner = np.searchsorted(tagPos, digitPos)
+  values = (buf[digitPos].astype(np.int64) - ord("0")) * np.power(10, tagPos[owner] - digitPos - 1, dtype=np.int64)
+  counts = np.zeros(n, dtype=np.int64)
+  np.add.at(counts, owner, values)
+  hasCount = np.zeros(n, dtype=bool)
+  hasCount[owner] = True
+  counts[~hasCount] = 1
+
+  tags = buf[tagPos]
+  isNewline = tags == ord("$")
+  isDead = (tags == ord("b")) | (tags == ord("."))
+  isAlive = ~isNewline & ~isDead
+
+  newlines = np.where(isNewline, counts, 0)
+  rows = row + np.cumsum(newlines) - newlines
+  lengths = np.where(isNewline, 0, counts)
+  before = np.cumsum(lengths) - lengths
+  # the column of a token is counted from the last "$" before it, or from [x] on the first row of the chunk
+  lastNewline = np.maximum.accumulate(np.where(isNewline, np.arange(n), -1))
+  starts = np.where(lastNewline >= 0, before - before[lastNewline], x + before)
+
+  row += int(newlines.sum())
+  x = int(starts[-1] + lengths[-1])
+  return rows[isAlive], starts[isAlive], counts[isAlive], row, x
+
+def iterRleRuns(f, body: bytes = b"", chunkBytes: int = RLE_CHUNK_BYTES):
+  # yields the live runs of the body of an RLE file, chunk by chunk
+  row = x = 0
+  pending = np.frombuffer(body, dtype=np.uint8)
+  while True:
+    data = f.read(chunkBytes)
+    buf = np.concatenate((pending, np.frombuffer(data, dtype=np.uint8)))
+    buf = buf[buf > ord(" ")]
+    ends = np.flatnonzero(buf == ord("!"))
+    finished = len(ends) > 0 or not data
+    if len(ends):
+      buf = buf[:ends[0]]
+    if not finished:
+      # digits after the last tag belong to a token that continues in the next chunk
+      isTag = (buf < ord("0")) | (buf > ord("9"))
+      lastTag = np.flatnonzero(isTag)
+      cut = lastTag[-1]+1 if len(lastTag) else 0
+      buf, pending = buf[:cut], buf[cut:]
+    rows, starts, lengths, row, x = decodeRleChunk(buf, row, x)
+    if len(rows):
+      yield rows, starts, lengths
+    if finished:
+      return
+
+def clipRuns(rows, starts, lengths, shape, top: int, left: int):
+  h, w = shape
+  rows = rows + top
+  ends = np.minimum(starts + lengths + left, w)
+  starts = np.maximum(starts + left, 0)
+  keep = (rows >= 0) & (rows < h) & (starts < ends)
+  return rows[keep], starts[keep], ends[keep] - starts[keep]
+
+def expandRuns(rows, starts, lengths):
+  # (row, column) of every cell of the runs
+  offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+  return np.repeat(rows, lengths), np.repeat(starts, lengths) + offsets
+
+def placeRuns(out, rows, starts, lengths, top: int, left: int):
+  rows, cols = expandRuns(*clipRuns(rows, starts, lengths, out.shape, top, left))
+  out[rows, cols] = 1
+
+def placeRunsPacked(words, width: int, rows, starts, lengths, top: int, left: int):
+  rows, cols = expandRuns(*clipRuns(rows, starts, lengths, (words.shape[0], width), top, left))
+  bits = np.left_shift(np.uint64(1), (cols % bitpacked_life.WORD_BITS).astype(np.uint64))
+  np.bitwise_or.at(words, (rows, cols // bitpacked_life.WORD_BITS), bits)
+
+def loadRle(path: str, out=None, top: int = None, left: int = None, packedWidth: int = None):
+  # [packedWidth] is the width of [out] when it is a bit-packed grid
+  with open(path, "rb") as f:
+    header, body = readRleHeader(f)
+    if out is None:
+      if header["width"] == None:
+        raise ValueError(f"{path} has no \"x = , y = \" line, pass the grid to load it into")
+      out = np.zeros((header["height"], header["width"]), dtype=np.int8)
+    width = out.shape[1] if packedWidth == None else packedWidth
+    if top == None:
+      top = (out.shape[0] - (header["height"] or 0)) // 2
+    if left == None:
+      left = (width - (header["width"] or 0)) // 2
+    for rows, starts, lengths in iterRleRuns(f, body):
+      if packedWidth == None:
+        placeRuns(out, rows, starts, lengths, top, left)
+      else:
+        placeRunsPacked(out, packedWidth, rows, starts, lengths, top, left)
+  return out, header
+
+def rleTokens(counts, tags):
+  # writes the tokens into one ascii array, returns it with the offset where every token ends
+  digits = np.where(counts > 1, np.searchsorted(10 ** np.arange(1, 19), counts, side="right") + 1, 0)
+  tokenEnds = np.cumsum(digits + 1)
+  text = np.empty(tokenEnds[-1], dtype=np.uint8)
+  text[tokenEnds - 1] = tags
+  place = counts.copy()
+  for d in range(1, int(digits.max()) + 1):
+    hasDigit = digits >= d
+    text[(tokenEnds - 1 - d)[hasDigit]] = ord("0") + place[hasDigit] % 10
+    place //= 10
+  return text, tokenEnds
+
+def wrapTokens(text, tokenEnds, lineLength: int):
+  # breaks [text] into lines of at most RLE_LINE_WIDTH characters between tokens, the first line already holds [lineLength]
+  cuts = []
+  pos = 0
+  while True:
+    fitting = tokenEnds.searchsorted(pos + RLE_LINE_WIDTH - lineLength, side="right")
+    cut = int(tokenEnds[fitting-1]) if fitting > 0 else pos
+    if cut <= pos and lineLength == 0:
+      # a token longer than a whole line
+      cut = int(tokenEnds[tokenEnds.searchsorted(pos, side="right")])
+    lineLength += cut - pos
+    pos = cut
+    if pos >= len(text):
+      break
+    cuts.append(pos)
+    lineLength = 0
+  return np.insert(text, cuts, ord("\n")), lineLength
+
+def saveRle(path: str, arr, rule: str = "B3/S23", comments=(), packedWidth: int = None):
+  # [packedWidth] is the width of [arr] when it is a bit-packed grid
+  height = arr.shape[0]
+  width = arr.shape[1] if packedWidth == None else packedWidth
+  lastRow = lastEnd = 0
+  lineLength = 0
+  with open(path, "w") as f:
+    for comment in comments:
+      f.write(comment if comment.startswith("#") else "#C " + comment)
+      f.write("\n")
+    f.write(f"x = {width}, y = {height}, rule = {rule}\n")
+    for blockTop in range(0, height, RLE_BLOCK_ROWS):
+      block = arr[blockTop:blockTop+RLE_BLOCK_ROWS]
+      if packedWidth != None:
+        block = bitpacked_life.unpackGrid(block, packedWidth)
+      padded = np.zeros((block.shape[0], width+2), dtype=np.int8)
+      padded[:, 1:-1] = block != 0
+      edges = np.diff(padded, axis=1)
+      rows, starts = np.nonzero(edges == 1)
+      ends = np.nonzero(edges == -1)[1]
+      if len(rows) == 0:
+        continue
+      rows = rows + blockTop
+
+      rowGaps = np.diff(rows, prepend=lastRow)
+      previousEnds = np.concatenate(([lastEnd], ends[:-1]))
+      deadGaps = starts - np.where(rowGaps > 0, 0, previousEnds)
+      lastRow, lastEnd = int(rows[-1]), int(ends[-1])
+
+      # every run is "$" (rows skipped), "b" (dead cells before it) and "o", empty tokens are dropped
+      counts = np.stack((rowGaps, deadGaps, ends - starts), axis=1).ravel()
+      tags = np.tile(np.frombuffer(b"$bo", dtype=np.uint8), len(rows))[counts > 0]
+      text, lineLength = wrapTokens(*rleTokens(counts[counts > 0], tags), lineLength)
+      f.write(text.tobytes().decode("ascii"))
+    f.write("!\n")
+
+def parseLeaf(line: bytes):
+  buf = np.frombuffer(line, dtype=np.uint8)
+  isRow = buf == ord("$")
+  rows = np.cumsum(isRow) - isRow
+  lastRow = np.maximum.accumulate(np.where(isRow, np.arange(len(buf)), -1))
+  cols = np.arange(len(buf)) - lastRow - 1
+  alive = buf == ord("*")
+  leaf = np.zeros((MC_LEAF_SIZE, MC_LEAF_SIZE), dtype=np.int8)
+  leaf[rows[alive], cols[alive]] = 1
+  return leaf
+
+def readMacrocell(path: str, store: hashlife.HashlifeStore = None):
+  # returns the store, the root node and the header
+  store = store or hashlife.HashlifeStore()
+  header = {"rule": None, "generation": 0, "comments": []}
+  nodes = [None]
+  leaves = {}
+  with open(path, "rb") as f:
+    if not f.readline().startswith(MC_MAGIC):
+      raise ValueError(f"{path} is not a Macrocell file")
+    for line in f:
+      line = line.strip()
+      if not line:
+        continue
+      if line.startswith(b"#"):
+        if line.startswith(b"#R"):
+          header["rule"] = line[2:].strip().decode()
+        elif line.startswith(b"#G"):
+          header["generation"] = int(line[2:])
+        else:
+          header["comments"].append(line.decode(errors="replace"))
+        continue
+      if line[:1] in (b".", b"*", b"$"):
+        node = leaves.get(line)
+        if node is None:
+          node = store.fromArray(parseLeaf(line), MC_LEAF_LEVEL)
+          leaves[line] = node
+        nodes.append(node)
+        continue
+      k, *children = (int(v) for v in line.split())
+      if k <= MC_LEAF_LEVEL:
+        raise ValueError(f"{path} is not a two state Macrocell file")
+      nodes.append(store.join(*(nodes[i] if i else store.empty(k-1) for i in children)))
+  if len(nodes) == 1:
+    return store, store.empty(MC_LEAF_LEVEL), header
+  return store, nodes[-1], header
+
+def leafArray(store, node, cache):
+  # the node is kept in the value so its id can't be reused while the entry exists
+  entry = cache.get(id(node))
+  if entry is None:
+    leaf = np.zeros((MC_LEAF_SIZE, MC_LEAF_SIZE), dtype=np.int8)
+    store.paint(node, leaf, 0, 0)
+    entry = cache[id(node)] = (node, leaf)
+  return entry[1]
+
+def nodeBounds(node, cache):
+  # (top, bottom, left, right) of the live cells of [node], relative to its top left corner
+  if node.k == 0:
+    return (0, 0, 0, 0)
+  bounds = cache.get(id(node))
+  if bounds != None:
+    return bounds[1]
+  half = 1 << (node.k-1)
+  top = left = None
+  for child, dy, dx in ((node.nw, 0, 0), (node.ne, 0, half), (node.sw, half, 0), (node.se, half, half)):
+    if child.n == 0:
+      continue
+    t, b, l, r = nodeBounds(child, cache)
+    if top == None:
+      top, bottom, left, right = t+dy, b+dy, l+dx, r+dx
+    else:
+      top, bottom, left, right = min(top, t+dy), max(bottom, b+dy), min(left, l+dx), max(right, r+dx)
+  cache[id(node)] = (node, (top, bottom, left, right))
+  return top, bottom, left, right
+
+def paintNode(store, node, out, top: int, left: int, leaves):
+  # like `hashlife.HashlifeStore.paint`, but leaves are copied as 8 x 8 blocks
+  size = 1 << node.k
+  if node.n == 0 or top >= out.shape[0] or left >= out.shape[1] or top+size <= 0 or left+size <= 0:
+    return
+  if node.k < MC_LEAF_LEVEL:
+    store.paint(node, out, top, left)
+    return
+  if node.k == MC_LEAF_LEVEL:
+    leaf = leafArray(store, node, leaves)
+    y0, x0 = max(top, 0), max(left, 0)
+    y1, x1 = min(top+size, out.shape[0]), min(left+size, out.shape[1])
+    out[y0:y1, x0:x1] |= leaf[y0-top:y1-top, x0-left:x1-left]
+    return
+  half = size >> 1
+  paintNode(store, node.nw, out, top, left, leaves)
+  paintNode(store, node.ne, out, top, left+half, leaves)
+  paintNode(store, node.sw, out, top+half, left, leaves)
+  paintNode(store, node.se, out, top+half, left+half, leaves)
+
+def loadMacrocell(path: str, out=None, top: int = None, left: int = None):
+  # the pattern is cropped to its live cells before it is placed
+  store, root, header = readMacrocell(path)
+  if root.n == 0:
+    height = width = 0
+    cropTop = cropLeft = 0
+  else:
+    cropTop, bottom, cropLeft, right = nodeBounds(root, {})
+    height, width = bottom-cropTop+1, right-cropLeft+1
+  header["width"], header["height"] = width, height
+  if out is None:
+    out = np.zeros((height, width), dtype=np.int8)
+  if top == None:
+    top = (out.shape[0] - height) // 2
+  if left == None:
+    left = (out.shape[1] - width) // 2
+  paintNode(store, root, out, top-cropTop, left-cropLeft, {})
+  return out, header
+
+def leafString(leaf):
+  rows = ["".join(".*"[c] for c in row).rstrip(".") for row in leaf.tolist()]
+  while rows and rows[-1] == "":
+    rows.pop()
+  return "".join(row + "$" for row in rows)
+
+def writeMacrocell(path: str, store: hashlife.HashlifeStore, root, rule: str = "B3/S23", generation: int = 0, comments=()):
+  # [root] is a node of [store], like the root of a `hashlife.HashlifeUniverse`
+  while root.k < MC_LEAF_LEVEL:
+    root = store.centre(root) if root.k > 0 else store.join(root, hashlife.OFF, hashlife.OFF, hashlife.OFF)
+  indices = {}
+  leaves = {}
+  with open(path, "w") as f:
+    f.write(f"{MC_MAGIC.decode()} (ca)\n")
+    f.write(f"#R {rule}\n")
+    if generation:
+      f.write(f"#G {generation}\n")
+    for comment in comments:
+      f.write(comment if comment.startswith("#") else "#C " + comment)
+      f.write("\n")
+
+    def visit(node):
+      # children are written before their parents, an empty node is 0
+      if node.n == 0:
+        return 0
+      index = indices.get(id(node))
+      if index != None:
+        return index
+      if node.k == MC_LEAF_LEVEL:
+        line = leafString(leafArray(store, node, leaves))
+      else:
+        line = f"{node.k} {visit(node.nw)} {visit(node.ne)} {visit(node.sw)} {visit(node.se)}"
+      f.write(line + "\n")
+      index = len(indices) + 1
+      indices[id(node)] = index
+      return index
+
+    if visit(root) == 0:
+      f.write(f"{max(root.k, MC_LEAF_LEVEL+1)} 0 0 0 0\n")
+
+def saveMacrocell(path: str, arr, rule: str = "B3/S23", comments=()):
+  store = hashlife.HashlifeStore()
+  k = MC_LEAF_LEVEL
+  while (1 << k) < max(arr.shape):
+    k += 1
+  writeMacrocell(path, store, store.fromArray(np.asarray(arr) != 0, k), rule, 0, comments)
+
+def loadPattern(path: str, out=None, top: int = None, left: int = None):
+  if os.path.splitext(path)[1].lower() == ".mc":
+    return loadMacrocell(path, out, top, left)
+  return loadRle(path, out, top, left)
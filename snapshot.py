@@ -0,0 +1,233 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+
+'''
+Compressed history files, so a run can be saved, resumed and scrubbed through.
+
+A history file holds the generations of one universe:
+  - binary universes (Game of Life, Maze, Larger Than Life) are stored bit-packed with np.packbits.
+  - continuous universes (Lenia) are stored quantised to [quantBits] (8 or 16) bits over [0, 1].
+Every [keyframeInterval]-th generation is a keyframe, which is stored whole. The generations between keyframes are stored as the difference to the previous one: an XOR of the packed bits for binary universes, a difference of the quantised values (modulo 2^quantBits) for continuous ones. Both are mostly zeros while the universe changes slowly and are compressed with zlib.
+
+Layout:
+  header  magic, kind, quantBits, height, width, keyframeInterval, index offset
+  frames  for every generation: generation number, keyframe flag, payload length, zlib payload
+  index   number of frames, then (generation, frame offset, keyframe flag) for every frame
+The index is written by `close`, and the header then points at it. A file that wasn't closed (the window was killed) has no index, and the reader rebuilds it by walking the frames.
+
+`HistoryReader` memory-maps the file and reads the index only, `load(n)` then decodes the last keyframe at or before generation n and the differences after it, never the whole file.
+
+  writer = HistoryWriter("run.cah", universeArr.shape, BINARY)
+  writer.append(universeArr)
+  writer.close()
+  universeArr = HistoryReader("run.cah").load(120)
+To resume a run, open the writer with append=True; it continues after the last generation in the file.
+A new universe isn't a continuation of the recorded one and shouldn't be appended to its file: `segmentPath` gives the next free "run-1.cah", "run-2.cah", ... for it.
+'''
+
+BINARY = 0
+CONTINUOUS = 1
+MAGIC = b"CAHIST01"
+HEADER = struct.Struct("<8sBBIIIQ")
+FRAME = struct.Struct("<QBI")
+INDEX_ENTRY = struct.Struct("<QQB")
+COUNT = struct.Struct("<Q")
+DEFAULT_KEYFRAME_INTERVAL = 64
+COMPRESSION_LEVEL = 6
+
+class HistoryFormat:
+  def __init__(self, kind: int, quantBits: int, shape):
+    self.kind = kind
+    self.quantBits = quantBits
+    self.shape = tuple(shape)
+    self.quantDtype = np.uint8 if quantBits <= 8 else np.uint16
+    self.levels = (1 << quantBits) - 1
+
+  def encodeState(self, arr):
+    # the state the frames are made of: packed bits or quantised values
+    if self.kind == BINARY:
+      return np.packbits(np.asarray(arr) != 0)
+    return np.rint(np.clip(arr, 0, 1) * self.levels).astype(self.quantDtype)
+
+  def decodeState(self, state):
+    if self.kind == BINARY:
+      return np.unpackbits(state, count=self.shape[0]*self.shape[1]).reshape(self.shape).view(np.int8)
+    return (state.astype(np.float64) / self.levels).reshape(self.shape)
+
+  def delta(self, previous, current):
+    if self.kind == BINARY:
+      return previous ^ current
+    return current - previous
+
+  def applyDelta(self, previous, delta):
+    if self.kind == BINARY:
+      return previous ^ delta
+    return previous + delta
+
+  def stateFromBytes(self, data: bytes):
+    return np.frombuffer(data, dtype=np.uint8 if self.kind == BINARY else self.quantDtype).copy()
+
+def readFrames(buf, start: int):
+  # walks the frames after the header when the index is missing
+  entries = []
+  offset = start
+  while offset + FRAME.size <= len(buf):
+    generation, key, length = FRAME.unpack_from(buf, offset)
+    if offset + FRAME.size + length > len(buf):
+      break
+    entries.append((generation, offset, key))
+    offset += FRAME.size + length
+  return entries, offset
+
+def readIndex(buf, indexOffset: int):
+  count, = COUNT.unpack_from(buf, indexOffset)
+  return [INDEX_ENTRY.unpack_from(buf, indexOffset + COUNT.size + i*INDEX_ENTRY.size) for i in range(count)]
+
+class HistoryReader:
+  def __init__(self, path: str):
+    self.file = open(path, "rb")
+    self.buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, kind, quantBits, h, w, self.keyframeInterval, indexOffset = HEADER.unpack_from(self.buf, 0)
+    if magic != MAGIC:
+      raise ValueError(f"{path} is not a history file")
+    self.format = HistoryFormat(kind, quantBits, (h, w))
+    if indexOffset:
+      self.entries = readIndex(self.buf, indexOffset)
+    else:
+      self.entries, _ = readFrames(self.buf, HEADER.size)
+    self.generations = [entry[0] for entry in self.entries]
+
+  def __len__(self):
+    return len(self.entries)
+
+  def lastGeneration(self):
+    return self.generations[-1] if self.generations else None
+
+  def frameState(self, i: int):
+    _, offset, _ = self.entries[i]
+    _, _, length = FRAME.unpack_from(self.buf, offset)
+    start = offset + FRAME.size
+    return self.format.stateFromBytes(zlib.decompress(self.buf[start:start+length]))
+
+  def loadState(self, generation: int):
+    i = np.searchsorted(self.generations, generation, side="right") - 1
+    if i < 0 or self.generations[i] != generation:
+      raise KeyError(f"generation {generation} is not in the history")
+    key = i
+    while not self.entries[key][2]:
+      key -= 1
+    state = self.frameState(key)
+    for j in range(key+1, i+1):
+      state = self.format.applyDelta(state, self.frameState(j))
+    return state
+
+  def load(self, generation: int = None):
+    if generation is None:
+      generation = self.lastGeneration()
+    return self.format.decodeState(self.loadState(generation))
+
+  def close(self):
+    self.buf.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+class HistoryWriter:
+  def __init__(self, path: str, shape, kind: int = BINARY, quantBits: int = 8, keyframeInterval: int = DEFAULT_KEYFRAME_INTERVAL, append: bool = False):
+    self.lock = threading.Lock()
+    self.entries = []
+    self.previous = None
+    self.nextGeneration = 0
+    if append and os.path.exists(path) and os.path.getsize(path) > 0:
+      with HistoryReader(path) as reader:
+        kind, quantBits, shape = reader.format.kind, reader.format.quantBits, reader.format.shape
+        keyframeInterval = reader.keyframeInterval
+        self.entries = list(reader.entries)
+        if self.entries:
+          self.previous = reader.loadState(reader.lastGeneration())
+          self.nextGeneration = reader.lastGeneration() + 1
+          _, lastOffset, _ = self.entries[-1]
+          _, _, length = FRAME.unpack_from(reader.buf, lastOffset)
+          end = lastOffset + FRAME.size + length
+        else:
+          end = HEADER.size
+      self.file = open(path, "r+b")
+      self.file.truncate(end)
+      self.file.seek(end)
+    else:
+      self.file = open(path, "wb")
+    self.format = HistoryFormat(kind, quantBits, shape)
+    self.keyframeInterval = keyframeInterval
+    self.writeHeader(0)
+    self.file.seek(0, os.SEEK_END)
+
+  def writeHeader(self, indexOffset: int):
+    h, w = self.format.shape
+    self.file.seek(0)
+    self.file.write(HEADER.pack(MAGIC, self.format.kind, self.format.quantBits, h, w, self.keyframeInterval, indexOffset))
+
+  def append(self, arr, generation: int = None):
+    with self.lock:
+      if self.file is not None:
+        self.appendFrame(arr, generation)
+
+  def appendFrame(self, arr, generation: int = None):
+    if generation is None:
+      generation = self.nextGeneration
+    state = self.format.encodeState(arr)
+    key = self.previous is None or len(self.entries) % self.keyframeInterval == 0
+    payload = state if key else self.format.delta(self.previous, state)
+    data = zlib.compress(payload.tobytes(), COMPRESSION_LEVEL)
+    offset = self.file.tell()
+    self.file.write(FRAME.pack(generation, key, len(data)))
+    self.file.write(data)
+    self.entries.append((generation, offset, key))
+    self.previous = state
+    self.nextGeneration = generation + 1
+
+  def flush(self):
+    with self.lock:
+      if self.file is not None:
+        self.file.flush()
+
+  def close(self):
+    # appending after closing does nothing, so a play loop can't write past the index
+    with self.lock:
+      if self.file is None:
+        return
+      indexOffset = self.file.tell()
+      self.file.write(COUNT.pack(len(self.entries)))
+      for entry in self.entries:
+        self.file.write(INDEX_ENTRY.pack(*entry))
+      self.writeHeader(indexOffset)
+      self.file.close()
+      self.file = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+def segmentPath(path: str):
+  root, ext = os.path.splitext(path)
+  n = 1
+  while os.path.exists(f"{root}-{n}{ext}"):
+    n += 1
+  return f"{root}-{n}{ext}"
+
+def saveSnapshot(path: str, arr, kind: int = BINARY, quantBits: int = 8):
+  with HistoryWriter(path, arr.shape, kind, quantBits) as writer:
+    writer.append(arr)
+
+def loadSnapshot(path: str, generation: int = None):
+  with HistoryReader(path) as reader:
+    return reader.load(generation)
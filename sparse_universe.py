@@ -0,0 +1,138 @@
+import numpy as np
+import life_rules
+
+'''
+An unbounded universe for Life-like rules, stored as [chunkSize] x [chunkSize] chunks in a dict keyed by chunk coordinates (chunk (cy, cx) holds the cells y in [cy*chunkSize, (cy+1)*chunkSize) and x in [cx*chunkSize, (cx+1)*chunkSize), which can be negative).
+
+Only chunks with live cells are stored. A step computes every stored chunk, and the empty neighbours of a chunk that has live cells on the edge they share (activity can only spread by one cell per generation). The chunks are stepped together as one (N, chunkSize+2, chunkSize+2) stack: every chunk is copied in with a one cell halo stitched from the edges and corners of its eight neighbours, the neighbour counts are added from eight shifted views of the stack, and the rule is one lookup in the table of `life_rules.py`. Chunks that come out empty are dropped. So memory and time follow the area around the live cells, and gliders fly on instead of wrapping around.
+
+Rules that give birth with 0 neighbours (B0) would fill the whole infinite universe and are refused.
+
+  universe = SparseUniverse(life_rules.compileRule("B3/S23"))
+  universe.paste(universeArr, top=0, left=0)
+  universe.step()
+  universeArr = universe.toArray(0, 0, ARR_W, ARR_W)
+'''
+
+DEFAULT_CHUNK_SIZE = 64
+HALO_SOURCES = (
+  # (neighbour offset, slice of the padded chunk, slice of the neighbour)
+  ((-1, 0), (0, slice(1, -1)), (-1, slice(None))),
+  ((1, 0), (-1, slice(1, -1)), (0, slice(None))),
+  ((0, -1), (slice(1, -1), 0), (slice(None), -1)),
+  ((0, 1), (slice(1, -1), -1), (slice(None), 0)),
+  ((-1, -1), (0, 0), (-1, -1)),
+  ((-1, 1), (0, -1), (-1, 0)),
+  ((1, -1), (-1, 0), (0, -1)),
+  ((1, 1), (-1, -1), (0, 0)),
+)
+
+class SparseUniverse:
+  def __init__(self, table=None, chunkSize: int = DEFAULT_CHUNK_SIZE):
+    if table is None:
+      table = life_rules.compileRule("B3/S23")
+    if table[0, 0]:
+      raise ValueError("Rules with B0 can't be run on an unbounded universe")
+    self.table = table.ravel()
+    self.chunkSize = chunkSize
+    self.chunks = {}
+    self.generation = 0
+
+  def chunkRange(self, start: int, length: int):
+    return range(start // self.chunkSize, (start + length - 1) // self.chunkSize + 1)
+
+  def paste(self, arr, top: int = 0, left: int = 0):
+    # sets every cell of the region, dead cells included
+    c = self.chunkSize
+    h, w = arr.shape
+    for cy in self.chunkRange(top, h):
+      for cx in self.chunkRange(left, w):
+        y0, x0 = max(top, cy*c), max(left, cx*c)
+        y1, x1 = min(top+h, (cy+1)*c), min(left+w, (cx+1)*c)
+        chunk = self.chunks.get((cy, cx))
+        if chunk is None:
+          chunk = np.zeros((c, c), dtype=np.int8)
+        chunk[y0-cy*c:y1-cy*c, x0-cx*c:x1-cx*c] = arr[y0-top:y1-top, x0-left:x1-left] != 0
+        if chunk.any():
+          self.chunks[(cy, cx)] = chunk
+        else:
+          self.chunks.pop((cy, cx), None)
+
+  def toArray(self, top: int, left: int, height: int, width: int):
+    c = self.chunkSize
+    out = np.zeros((height, width), dtype=np.int8)
+    for cy in self.chunkRange(top, height):
+      for cx in self.chunkRange(left, width):
+        chunk = self.chunks.get((cy, cx))
+        if chunk is None:
+          continue
+        y0, x0 = max(top, cy*c), max(left, cx*c)
+        y1, x1 = min(top+height, (cy+1)*c), min(left+width, (cx+1)*c)
+        out[y0-top:y1-top, x0-left:x1-left] = chunk[y0-cy*c:y1-cy*c, x0-cx*c:x1-cx*c]
+    return out
+
+  def population(self):
+    return sum(int(chunk.sum()) for chunk in self.chunks.values())
+
+  def bounds(self):
+    # (top, left, height, width) of the live cells, None if there are none
+    if not self.chunks:
+      return None
+    c = self.chunkSize
+    top = left = None
+    bottom = right = None
+    for (cy, cx), chunk in self.chunks.items():
+      rows = np.nonzero(chunk.any(axis=1))[0]
+      cols = np.nonzero(chunk.any(axis=0))[0]
+      top = cy*c + rows[0] if top is None else min(top, cy*c + rows[0])
+      bottom = cy*c + rows[-1] if bottom is None else max(bottom, cy*c + rows[-1])
+      left = cx*c + cols[0] if left is None else min(left, cx*c + cols[0])
+      right = cx*c + cols[-1] if right is None else max(right, cx*c + cols[-1])
+    return int(top), int(left), int(bottom-top+1), int(right-left+1)
+
+  def candidates(self):
+    keys = set(self.chunks)
+    for (cy, cx), chunk in self.chunks.items():
+      top, bottom = chunk[0].any(), chunk[-1].any()
+      left, right = chunk[:, 0].any(), chunk[:, -1].any()
+      if top:
+        keys.add((cy-1, cx))
+      if bottom:
+        keys.add((cy+1, cx))
+      if left:
+        keys.add((cy, cx-1))
+      if right:
+        keys.add((cy, cx+1))
+      if chunk[0, 0]:
+        keys.add((cy-1, cx-1))
+      if chunk[0, -1]:
+        keys.add((cy-1, cx+1))
+      if chunk[-1, 0]:
+        keys.add((cy+1, cx-1))
+      if chunk[-1, -1]:
+        keys.add((cy+1, cx+1))
+    return list(keys)
+
+  def step(self):
+    keys = self.candidates()
+    c = self.chunkSize
+    stack = np.zeros((len(keys), c+2, c+2), dtype=np.uint8)
+    for i, (cy, cx) in enumerate(keys):
+      chunk = self.chunks.get((cy, cx))
+      if chunk is not None:
+        stack[i, 1:-1, 1:-1] = chunk
+      for (dy, dx), target, source in HALO_SOURCES:
+        neighbour = self.chunks.get((cy+dy, cx+dx))
+        if neighbour is not None:
+          stack[i][target] = neighbour[source]
+
+    index = stack[:, 1:-1, 1:-1] * np.uint8(9)
+    for dy in (0, 1, 2):
+      for dx in (0, 1, 2):
+        if dy != 1 or dx != 1:
+          index += stack[:, dy:dy+c, dx:dx+c]
+    newChunks = np.take(self.table, index, mode="clip")
+
+    alive = newChunks.any(axis=(1, 2))
+    self.chunks = {keys[i]: newChunks[i] for i in np.nonzero(alive)[0]}
+    self.generation += 1
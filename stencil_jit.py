@@ -0,0 +1,86 @@
+import numpy as np
+import kernel_cache
+
+try:
+  import numba
+  HAVE_NUMBA = True
+  prange = numba.prange
+except ImportError:
+  numba = None
+  HAVE_NUMBA = False
+  prange = range
+
+'''
+Neighbour counts for any binary Larger Than Life kernel (circular, or any custom mask), without going through the float convolution of `scipy.ndimage.correlate`.
+
+A kernel is compiled once into run lists: every row of the mask is split into runs of consecutive ones, and each run is kept as (row offset, first column offset, last column offset) from the middle of the kernel. The count of a cell is the sum, over the runs, of the cells of the run's row between the two column offsets. Along a row that window sum is updated as the window slides (one cell comes in, one goes out), so a run costs O(1) per cell whatever its length, and a kernel costs O(number of runs) per cell, about 2R+1 for the circular kernel instead of (2R+1)^2. Everything loops around the edges like mode="wrap", and the counts are exactly the ones of the correlate path.
+
+If Numba is installed, the sliding windows run as one compiled function, parallel over the rows (prange) and cached on disk. Without Numba the same runs are computed with NumPy: the window sums of every distinct (first, last) column pair come from one cumulative sum along the rows, and are added for every row offset with np.roll.
+
+Compiled run lists are kept in an LRU cache keyed by the contents of the kernel (see `kernel_cache.py`), so switching back to a kernel doesn't compile it again.
+'''
+
+runCache = kernel_cache.KernelCache()
+
+def compileRuns(kernel):
+  kernel = np.asarray(kernel)
+  return runCache.get(kernel_cache.arrayKey("runs", kernel), lambda: buildRuns(kernel))
+
+def buildRuns(kernel):
+  if not np.isin(kernel, (0, 1)).all():
+    raise ValueError("Run lists need a kernel of zeros and ones")
+  kh, kw = kernel.shape
+  rows, starts, ends = [], [], []
+  for i in range(kh):
+    # a run starts where a one follows a zero and ends where a zero follows a one
+    edges = np.diff(np.concatenate(([0], kernel[i] != 0, [0])).astype(np.int8))
+    for start, end in zip(np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]):
+      rows.append(i - kh//2)
+      starts.append(start - kw//2)
+      ends.append(end - 1 - kw//2)
+  return (np.array(rows, dtype=np.int64), np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64))
+
+def countRunsLoop(arr, runRows, runStarts, runEnds, out):
+  h, w = arr.shape
+  for y in prange(h):
+    for x in range(w):
+      out[y, x] = 0
+    for r in range(len(runRows)):
+      src = (y + runRows[r]) % h
+      a = runStarts[r]
+      b = runEnds[r]
+      s = 0
+      for x in range(a, b+1):
+        s += arr[src, x % w]
+      for x in range(w):
+        out[y, x] += s
+        s += arr[src, (x + b + 1) % w] - arr[src, (x + a) % w]
+  return out
+
+if HAVE_NUMBA:
+  countRunsCompiled = numba.njit(parallel=True, cache=True)(countRunsLoop)
+
+def countRunsNumpy(arr, runRows, runStarts, runEnds, out):
+  h, w = arr.shape
+  out[...] = 0
+  reach = int(max(-runStarts.min(), runEnds.max(), 0))
+  padded = np.pad(arr.astype(np.int32), ((0, 0), (reach, reach)), mode="wrap")
+  prefix = np.zeros((h, w + 2*reach + 1), dtype=np.int32)
+  np.cumsum(padded, axis=1, out=prefix[:, 1:])
+  windows = {}
+  for dy, a, b in zip(runRows, runStarts, runEnds):
+    window = windows.get((a, b))
+    if window is None:
+      # sum of the cells x+a to x+b of every row
+      window = prefix[:, reach+b+1:reach+b+1+w] - prefix[:, reach+a:reach+a+w]
+      windows[(a, b)] = window
+    # the count of row y uses the row y+dy
+    out += np.roll(window, -dy, axis=0)
+  return out
+
+def countNeighbours(arr, runs, out=None):
+  if out is None:
+    out = np.empty(arr.shape, dtype=np.int32)
+  if HAVE_NUMBA:
+    return countRunsCompiled(arr, *runs, out)
+  return countRunsNumpy(arr, *runs, out)
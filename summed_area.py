@@ -0,0 +1,90 @@
+import math
+import numpy as np
+
+'''
+Neighbour counts for the Larger Than Life kernels from summed-area tables (integral images), so the cost per cell does not depend on the radius (or only linearly for circles).
+
+The array is looped, so it is first padded by the radius on every side with np.pad(mode="wrap"). Then:
+  - "Moore": the kernel is a (2r+1) x (2r+1) square, which is 4 lookups in the summed-area table of the padded array.
+  - "von Neumann": the kernel is the diamond |dx|+|dy| <= r. The diamonds of the first column are summed row span by row span. Moving a diamond one column to the right adds the two diagonal edges on its right and removes the two on the left of the old one, and every edge is 2 lookups in the running sums along the diagonals of the padded array. So a row of counts is a cumulative sum of 8 lookups per cell, and the memory stays a few int32 arrays of the size of the padded array.
+  - "circular": the kernel is dx^2+dy^2 <= r^2, which is one horizontal span per row. Every row of the kernel is 2 lookups in the running sums of the rows, so the cost is O(r) per cell instead of O(r^2).
+
+The counts include the middle cell, which is removed again if the kernel doesn't include it. They are the same as `scipy.ndimage.correlate(arr, kernel, mode="wrap")` with the kernels built by `larger_than_life.buildKernel`.
+'''
+
+SAT_KERNEL_TYPES = ("Moore", "von Neumann", "circular")
+
+def summedAreaTable(arr):
+  sat = np.zeros((arr.shape[0]+1, arr.shape[1]+1), dtype=np.int32)
+  np.cumsum(arr, axis=0, dtype=np.int32, out=sat[1:, 1:])
+  np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+  return sat
+
+def mooreCounts(padded, r: int, shape):
+  h, w = shape
+  d = 2*r+1
+  sat = summedAreaTable(padded)
+  return sat[d:d+h, d:d+w] - sat[:h, d:d+w] - sat[d:d+h, :w] + sat[:h, :w]
+
+def diagonalPrefixSums(padded):
+  # main[i+1, j+1] is the sum of padded[i-t, j-t] and anti[i+1, j+1] the sum of padded[i-t, j+t] for t >= 0, with a zero border
+  ph, pw = padded.shape
+  main = np.zeros((ph+1, pw+2), dtype=np.int32)
+  anti = np.zeros((ph+1, pw+2), dtype=np.int32)
+  for i in range(ph):
+    np.add(padded[i], main[i, :pw], out=main[i+1, 1:pw+1])
+    np.add(padded[i], anti[i, 2:], out=anti[i+1, 1:pw+1])
+  return main, anti
+
+def vonNeumannCounts(padded, r: int, shape):
+  h, w = shape
+  counts = np.zeros(shape, dtype=np.int32)
+  # the diamonds of the first column, one row span per row offset
+  rowSums = np.zeros((padded.shape[0], 2*r+2), dtype=np.int32)
+  np.cumsum(padded[:, :2*r+1], axis=1, dtype=np.int32, out=rowSums[:, 1:])
+  for dy in range(-r, r+1):
+    span = r - abs(dy)
+    counts[:, 0] += rowSums[r+dy:r+dy+h, r+span+1] - rowSums[r+dy:r+dy+h, r-span]
+  if w == 1:
+    return counts
+
+  # moving a diamond one column right adds its right edge (two diagonals) and removes the left edge of the old one
+  main, anti = diagonalPrefixSums(padded)
+  def at(sums, dy: int, dx: int):
+    # sums at (Y+dy, X+dx) for every cell (Y, X) of the padded array whose diamond is the one of columns 1 to w-1
+    return sums[1+r+dy:1+r+dy+h, 2+r+dx:1+r+dx+w]
+  delta = counts[:, 1:]
+  delta += at(main, 0, r)
+  delta -= at(main, -r-1, -1)
+  delta += at(anti, r, 0)
+  delta -= at(anti, 0, r)
+  delta -= at(anti, 0, -r-1)
+  delta += at(anti, -r-1, 0)
+  delta -= at(main, r, -1)
+  delta += at(main, 0, -r-1)
+  np.cumsum(counts, axis=1, out=counts)
+  return counts
+
+def circularCounts(padded, r: int, shape):
+  h, w = shape
+  rowSums = np.zeros((padded.shape[0], padded.shape[1]+1), dtype=np.int32)
+  np.cumsum(padded, axis=1, dtype=np.int32, out=rowSums[:, 1:])
+  counts = np.zeros(shape, dtype=np.int32)
+  for dy in range(-r, r+1):
+    span = math.isqrt(r*r - dy*dy)
+    rows = rowSums[r+dy:r+dy+h]
+    counts += rows[:, r+span+1:r+span+1+w]
+    counts -= rows[:, r-span:r-span+w]
+  return counts
+
+def neighbourCounts(arr, kType: str, r: int, includeMiddle: bool):
+  padded = np.pad(arr, r, mode="wrap")
+  if kType == "Moore":
+    counts = mooreCounts(padded, r, arr.shape)
+  elif kType == "circular":
+    counts = circularCounts(padded, r, arr.shape)
+  else:
+    counts = vonNeumannCounts(padded, r, arr.shape)
+  if not includeMiddle:
+    counts -= arr
+  return counts
@@ -0,0 +1,63 @@
+import threading
+import numpy as np
+import instrumentation
+from PIL import ImageTk, Image
+
+'''
+Draws a universe on a Tk canvas. Used by every tkinter script instead of building a new image for every frame.
+
+`submit` can be called from any thread. It converts the universe to grey levels in a preallocated (ARR_H, ARR_W) uint8 array and writes every cell as a [pixelWidth] x [pixelWidth] block into a preallocated (ARR_H*pixelWidth, ARR_W*pixelWidth) frame, so no memory is allocated per frame. The frames are double buffered: the finished frame is swapped in under a lock and marked as pending.
+
+Tk isn't thread safe, so the canvas is only touched from the main thread: `poll` runs every [pollMs] milliseconds in the Tk event loop and pastes the pending frame into one persistent PhotoImage, which updates the canvas in place. When frames are submitted faster than they are drawn, only the newest is drawn.
+
+The time `submit` and the paste take is recorded as the "submit" and "paste" phases of [timings] (see `instrumentation.py`).
+
+Binary universes are drawn with alive cells black and dead cells white. With [continuous] set, the values in [0, 1] are drawn as grey levels (0 black, 1 white), like Lenia.
+'''
+
+DEFAULT_POLL_MS = 5
+BINARY_PALETTE = np.array([255, 0], dtype=np.uint8)
+
+def upscaleInto(small, out, pixelWidth: int):
+  h, w = small.shape
+  out.reshape(h, pixelWidth, w, pixelWidth)[...] = small[:, None, :, None]
+  return out
+
+class TkGridRenderer:
+  def __init__(self, canvas, shape, pixelWidth: int, continuous: bool = False, pollMs: int = DEFAULT_POLL_MS, timings=instrumentation.DISABLED):
+    self.canvas = canvas
+    self.timings = timings
+    self.pixelWidth = pixelWidth
+    self.continuous = continuous
+    self.pollMs = pollMs
+    h, w = shape
+    self.small = np.empty((h, w), dtype=np.uint8)
+    self.frames = [np.full((h*pixelWidth, w*pixelWidth), 255, dtype=np.uint8) for _ in range(2)]
+    self.frameLock = threading.Lock()
+    self.submitLock = threading.Lock()
+    self.pending = False
+    self.photo = ImageTk.PhotoImage("L", (w*pixelWidth, h*pixelWidth))
+    self.imageId = canvas.create_image(0, 0, anchor="nw", image=self.photo)
+    canvas.after(self.pollMs, self.poll)
+
+  def toGrey(self, arr):
+    if self.continuous:
+      np.multiply(arr, 255, out=self.small, casting="unsafe")
+    else:
+      np.take(BINARY_PALETTE, arr, out=self.small, mode="clip")
+    return self.small
+
+  def submit(self, arr):
+    with self.submitLock, self.timings.phase("submit"):
+      upscaleInto(self.toGrey(arr), self.frames[1], self.pixelWidth)
+      with self.frameLock:
+        self.frames.reverse()
+        self.pending = True
+
+  def poll(self):
+    with self.frameLock:
+      if self.pending:
+        with self.timings.phase("paste"):
+          self.photo.paste(Image.fromarray(self.frames[0]))
+        self.pending = False
+    self.canvas.after(self.pollMs, self.poll)